@@ -0,0 +1,7 @@
+"""
+Benchmarks and stress checks for the online store.
+
+Each module is runnable with ``python -m benchmarks.<name>`` from the
+project folder and works on a throwaway SQLite database, so it never
+touches db.sqlite3.
+"""
@@ -0,0 +1,146 @@
+"""
+Benchmark the async read endpoints under WSGI and ASGI side by side.
+
+The same requests are sent to check_cart_status, product_detail_json and
+catalog_feed with a given number of concurrent clients, once through the
+WSGI handler (one thread per client, as a threaded WSGI server would do)
+and once through the ASGI handler (one task per client on a single event
+loop). For every endpoint and concurrency level it reports throughput and
+latency percentiles.
+
+    python -m benchmarks.async_views --concurrency 1 10 50 --requests 500
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.environment import setup_django
+from benchmarks.store_flows import seed_catalog
+
+def summarize(latencies, elapsed):
+    """
+    Return throughput and latency percentiles of a run.
+    """
+    from online_store.instrumentation import percentile
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+def run_wsgi(user, paths, concurrency):
+    """
+    Send the requests through the WSGI handler from a pool of threads.
+    """
+    from django.db import connection
+    from django.test import Client
+
+    def worker(worker_paths):
+        client = Client()
+        client.force_login(user)
+        latencies = []
+        for path in worker_paths:
+            start = time.perf_counter()
+            response = client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{path} failed with HTTP {response.status_code}")
+        connection.close()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(worker, [paths[index::concurrency] for index in range(concurrency)]))
+    elapsed = time.perf_counter() - start
+    return summarize([latency for latencies in results for latency in latencies], elapsed)
+
+def run_asgi(user, paths, concurrency):
+    """
+    Send the requests through the ASGI handler from tasks on one event loop.
+    """
+    from django.test import AsyncClient
+
+    clients = []
+    for index in range(concurrency):
+        client = AsyncClient()
+        client.force_login(user)
+        clients.append(client)
+
+    async def worker(client, worker_paths):
+        latencies = []
+        for path in worker_paths:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{path} failed with HTTP {response.status_code}")
+        return latencies
+
+    async def run():
+        return await asyncio.gather(*[
+            worker(client, paths[index::concurrency]) for index, client in enumerate(clients)
+        ])
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    return summarize([latency for latencies in results for latency in latencies], elapsed)
+
+def run_suite(catalog_size, cart_size, concurrency_levels, requests, seed):
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from products.models import Product
+    from cart.models import Cart, CartItem
+
+    rng = random.Random(seed)
+    seed_catalog(catalog_size, rng)
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    categories = [value for value, label in Product.CATEGORY_CHOICES]
+    user, created = User.objects.get_or_create(username='async-shopper')
+    cart, created = Cart.objects.get_or_create(user=user)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=1)
+        for product_id in rng.sample(product_ids, cart_size)
+    ])
+    cart.recalculate_totals()
+
+    endpoints = {
+        'check_cart_status': lambda: reverse('check_cart_status'),
+        'product_detail_json': lambda: reverse('product_detail_json', args=[rng.choice(product_ids)]),
+        'catalog_feed': lambda: f"{reverse('catalog_feed')}?category={rng.choice(categories)}",
+    }
+    print(f"{'endpoint':22} {'clients':>7} {'server':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, make_path in endpoints.items():
+        paths = [make_path() for _ in range(requests)]
+        for concurrency in concurrency_levels:
+            for server, run in (('wsgi', run_wsgi), ('asgi', run_asgi)):
+                stats = run(user, paths, concurrency)
+                print(f"{name:22} {concurrency:>7} {server:>6} {stats['throughput']:>9} {stats['p50_ms']:>9} "
+                      f"{stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--catalog-size', type=int, default=10000, help="Number of products.")
+    parser.add_argument('--cart-size', type=int, default=10, help="Lines in the shopper's cart.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50],
+                        help="Numbers of concurrent clients.")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and run.")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed for the synthetic data.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+    run_suite(args.catalog_size, args.cart_size, args.concurrency, args.requests, args.seed)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Concurrency stress check for checkout.
+
+Many buyers check out the same product at the same time from separate
+threads (and therefore separate database connections). The run fails if
+more units are sold than were in stock.
+
+    python -m benchmarks.checkout_stress --buyers 300 --stock 100
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.environment import setup_django
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=300, help="Number of parallel checkouts.")
+    parser.add_argument('--stock', type=int, default=100, help="Units of the contested product in stock.")
+    parser.add_argument('--quantity', type=int, default=1, help="Units each buyer orders.")
+    parser.add_argument('--threads', type=int, default=32, help="Worker threads.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection
+    from products.models import Product
+    from cart.checkout import InsufficientStock, place_order
+    from cart.models import Cart, CartItem
+
+    product = Product.objects.create(
+        name='Contested product', description='Stress test', price=10,
+        category=Product.LAPTOP, inventory=args.stock,
+    )
+    carts = []
+    for number in range(args.buyers):
+        user = User.objects.create(username=f'buyer{number}')
+        cart = Cart.objects.create(user=user)
+        # Lines are written directly, without holds, so that every buyer
+        # races for the stock in place_order instead of at add_to_cart
+        CartItem.objects.create(cart=cart, product=product, quantity=args.quantity)
+        cart.recalculate_totals()
+        carts.append(cart)
+
+    lock = threading.Lock()
+    outcome = {'sold': 0, 'rejected': 0, 'retries': 0}
+    start = threading.Barrier(min(args.threads, args.buyers))
+
+    def checkout(cart):
+        try:
+            start.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            while True:
+                try:
+                    order = place_order(cart)
+                except InsufficientStock:
+                    key = 'rejected'
+                except OperationalError:
+                    # SQLite reports lock contention instead of waiting; retry like a client would
+                    with lock:
+                        outcome['retries'] += 1
+                    continue
+                else:
+                    key = 'sold'
+                    units = order.total_items
+                with lock:
+                    outcome[key] += units if key == 'sold' else 1
+                return
+        finally:
+            connection.close()
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(checkout, carts))
+    elapsed = time.perf_counter() - began
+
+    product.refresh_from_db()
+    print(f"buyers={args.buyers} stock={args.stock} quantity={args.quantity} threads={args.threads}")
+    print(f"sold={outcome['sold']} rejected={outcome['rejected']} retries={outcome['retries']} "
+          f"remaining={product.inventory} elapsed={elapsed:.2f}s")
+    expected_sold = min(args.stock // args.quantity, args.buyers) * args.quantity
+    if outcome['sold'] + product.inventory != args.stock or outcome['sold'] > args.stock:
+        print("FAIL: inventory does not match units sold (oversell).")
+        return 1
+    if outcome['sold'] != expected_sold:
+        print(f"FAIL: expected {expected_sold} units sold.")
+        return 1
+    print("OK: no oversell.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
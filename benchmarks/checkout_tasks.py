@@ -0,0 +1,76 @@
+"""
+Benchmark checkout latency against the amount of post-checkout work.
+
+Every order queues a number of synthetic follow-up tasks that each take
+--work-ms milliseconds (standing in for emails, receipts or analytics).
+Checkouts are timed through the view twice per task count: with the
+tasks run inline after the commit (TASKS_EAGER, as if checkout did the
+work itself) and with the tasks queued for the run_tasks worker. Queued
+checkouts should keep the same p95 however much follow-up work there is.
+
+    python -m benchmarks.checkout_tasks --tasks 0 1 5 20 --work-ms 20
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.environment import setup_django
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, nargs='+', default=[0, 1, 5, 20],
+                        help="Follow-up tasks queued per order.")
+    parser.add_argument('--work-ms', type=float, default=20, help="Milliseconds each follow-up task takes.")
+    parser.add_argument('--checkouts', type=int, default=50, help="Checkouts timed per run.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from online_store.instrumentation import percentile
+    from products.models import Product
+    from cart.models import Cart
+    from tasks.models import Task
+    from tasks.queue import task
+
+    setup_test_environment()
+    names = []
+    for number in range(max(args.tasks)):
+        @task(name=f'benchmarks.follow_up_{number}')
+        def follow_up(order_id):
+            time.sleep(args.work_ms / 1000)
+        names.append(follow_up.task_name)
+
+    product = Product.objects.create(
+        name='Benchmark product', description='Checkout tasks', price=10,
+        category=Product.LAPTOP, inventory=1_000_000,
+    )
+    user = User.objects.create_user('task-shopper')
+    cart, created = Cart.objects.get_or_create(user=user)
+    client = Client()
+    client.force_login(user)
+
+    print(f"{'tasks':>5} {'mode':>7} {'p50 ms':>9} {'p95 ms':>9} {'queued':>7}")
+    for count in args.tasks:
+        settings.ORDER_PLACED_TASKS = names[:count]
+        for mode in ('inline', 'queued'):
+            settings.TASKS_EAGER = mode == 'inline'
+            Task.objects.all().delete()
+            latencies = []
+            for _ in range(args.checkouts):
+                cart.add_item(product, 1)
+                start = time.perf_counter()
+                response = client.post(reverse('checkout'))
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 302:
+                    raise RuntimeError(f"Checkout failed with HTTP {response.status_code}")
+            latencies.sort()
+            print(f"{count:>5} {mode:>7} {percentile(latencies, 50):>9.2f} {percentile(latencies, 95):>9.2f} "
+                  f"{Task.objects.count():>7}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'online_store.settings')
+
+def setup_django(db_path=None):
+    """
+    Configure Django against a fresh SQLite database and create its tables.
+    
+    Returns the path of the database file.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='store-bench-'), 'bench.sqlite3')
+    elif os.path.exists(db_path):
+        os.remove(db_path)
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    # Wait for the write lock instead of failing fast under concurrency
+    settings.DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 30
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    return db_path
@@ -0,0 +1,62 @@
+"""
+Query count and latency of placing an order for different cart sizes.
+
+The insert path uses bulk_create, so the number of queries must not
+grow with the number of cart lines. SQLite caps the parameters of one
+statement, so very large carts split the order item INSERT into batches;
+those batches are reported separately.
+
+    python -m benchmarks.order_queries --sizes 1 10 50 200
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.environment import setup_django
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200], help="Cart sizes in lines.")
+    parser.add_argument('--repeat', type=int, default=5, help="Orders placed per cart size.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from products.models import Product
+    from cart.checkout import place_order
+    from cart.models import Cart, CartItem
+
+    products = Product.objects.bulk_create([
+        Product(name=f'Product {number}', description='Benchmark', price=10,
+                category=Product.LAPTOP, inventory=1_000_000)
+        for number in range(max(args.sizes))
+    ])
+    user = User.objects.create(username='buyer')
+    cart = Cart.objects.create(user=user)
+
+    print(f"{'lines':>6} {'queries':>8} {'batches':>8} {'ms/order':>9}")
+    query_counts = set()
+    for size in args.sizes:
+        timings = []
+        for _ in range(args.repeat):
+            CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in products[:size]])
+            cart.recalculate_totals()
+            with CaptureQueriesContext(connection) as queries:
+                began = time.perf_counter()
+                place_order(cart)
+                timings.append(time.perf_counter() - began)
+        batches = sum(1 for query in queries.captured_queries
+                      if query['sql'].startswith('INSERT INTO "cart_orderitem"'))
+        query_counts.add(len(queries) - batches)
+        print(f"{size:>6} {len(queries):>8} {batches:>8} {1000 * sum(timings) / len(timings):>9.2f}")
+
+    if len(query_counts) != 1:
+        print("FAIL: query count depends on the cart size.")
+        return 1
+    print("OK: constant number of queries.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Query plan regression check for the hot store views.
+
+Every SQL statement issued by the main catalog and cart flows is run
+through EXPLAIN QUERY PLAN. The check fails if any of them scans a whole
+table or sorts its rows in a temporary B-tree instead of using an index.
+
+    python -m benchmarks.query_plans
+"""
+import argparse
+import re
+import sys
+
+from benchmarks.environment import setup_django
+
+# Plan lines that mean the query touches every row of a table
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+
+def explain(cursor, sql):
+    """
+    Return the detail column of EXPLAIN QUERY PLAN for a statement.
+    """
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+    return [row[-1] for row in cursor.fetchall()]
+
+def find_problems(plan):
+    """
+    Return the plan lines that indicate a full table scan or a temporary sort.
+    """
+    return [line for line in plan if FULL_SCAN_RE.match(line) or TEMP_SORT_RE.search(line)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000, help="Size of the seeded catalog.")
+    parser.add_argument('--verbose', action='store_true', help="Print the plan of every statement.")
+    args = parser.parse_args(argv)
+
+    from django.conf import settings
+    # Bypass the catalog cache so every view reaches the database
+    settings.CACHES['catalog'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    setup_django()
+    import json
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.urls import reverse
+    from products.facets import refresh_facets
+    from products.models import Product
+    from products.pagination import encode_cursor
+    from products.recommendations import build_recommendations, get_recommendations, save_recommendations
+    from cart.models import CartItem
+
+    setup_test_environment()
+    categories = [value for value, label in Product.CATEGORY_CHOICES]
+    Product.objects.bulk_create([
+        Product(name=f'Product {number:05d}', description='Query plan check', price=10 + number % 90,
+                category=categories[number % len(categories)], inventory=number % 7)
+        for number in range(args.products)
+    ])
+    refresh_facets()
+    save_recommendations(build_recommendations())
+    # Load the snapshot now; pages only check for a newer one every few minutes
+    get_recommendations()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    product = Product.objects.filter(inventory__gt=5).first()
+    other = Product.objects.filter(inventory__gt=5).exclude(pk=product.pk).first()
+    user = User.objects.create(username='shopper')
+    client = Client()
+    client.force_login(user)
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+    def item_id():
+        return CartItem.objects.get(cart__user=user, product=product).id
+
+    first_page = client.get(reverse('product_feed'), {'category': Product.LAPTOP}).json()
+    price_page = client.get(reverse('product_feed'), {'category': Product.LAPTOP, 'sort': '-price'}).json()
+    # Well-formed cursors whose values do not fit the ordering fields fall back to the first page
+    forged_cursor = encode_cursor(['x', 'abc'])
+    flows = [
+        ('product_list', lambda: client.get(reverse('product_list'))),
+        ('product_list category', lambda: client.get(reverse('product_list'), {'category': Product.LAPTOP})),
+        ('product_list in stock', lambda: client.get(
+            reverse('product_list'), {'category': Product.LAPTOP, 'in_stock': 'on'},
+        )),
+        ('product_list price range', lambda: client.get(
+            reverse('product_list'), {'min_price': 20, 'max_price': 40, 'sort': 'price'},
+        )),
+        ('product_feed next page', lambda: client.get(first_page['next_url'])),
+        ('product_feed price next page', lambda: client.get(price_page['next_url'])),
+        ('product_list forged cursor', lambda: client.get(reverse('product_list'), {'after': forged_cursor})),
+        ('product_feed forged cursor', lambda: client.get(reverse('product_feed'), {'after': forged_cursor})),
+        ('catalog_feed forged cursor', lambda: client.get(reverse('catalog_feed'), {'after': forged_cursor})),
+        ('product_detail', lambda: client.get(reverse('product_detail', args=[product.pk]))),
+        ('add_to_cart', lambda: client.get(reverse('add_to_cart', args=[product.pk]), **ajax)),
+        ('add_to_cart again', lambda: client.get(reverse('add_to_cart', args=[product.pk]), **ajax)),
+        ('batch_update_cart', lambda: client.post(
+            reverse('batch_update_cart'),
+            json.dumps({'operations': [{'product_id': other.pk, 'quantity': 1}]}),
+            content_type='application/json',
+        )),
+        ('check_cart_status', lambda: client.get(reverse('check_cart_status'), **ajax)),
+        ('cart_detail', lambda: client.get(reverse('cart_detail'))),
+        ('update_cart', lambda: client.post(reverse('update_cart', args=[item_id()]), {'quantity': 2}, **ajax)),
+        ('checkout', lambda: client.get(reverse('checkout'))),
+        ('checkout submit', lambda: client.post(reverse('checkout'))),
+        ('order_history', lambda: client.get(reverse('order_history'))),
+        ('order_history forged cursor', lambda: client.get(reverse('order_history'), {'after': forged_cursor})),
+    ]
+
+    failures = 0
+    with connection.cursor() as cursor:
+        for name, flow in flows:
+            with CaptureQueriesContext(connection) as queries:
+                response = flow()
+            if response.status_code >= 400:
+                print(f"FAIL {name}: HTTP {response.status_code}")
+                failures += 1
+                continue
+            statements = [
+                query['sql'] for query in queries.captured_queries
+                if query['sql'].split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')
+            ]
+            problems = []
+            for sql in statements:
+                plan = explain(cursor, sql)
+                if args.verbose:
+                    print(f"  {sql[:100]}")
+                    for line in plan:
+                        print(f"    {line}")
+                problems += [(sql, line) for line in find_problems(plan)]
+            status = 'FAIL' if problems else 'ok'
+            print(f"{status:4} {name} ({len(statements)} statements)")
+            for sql, line in problems:
+                print(f"       {line}: {sql[:120]}")
+            failures += bool(problems)
+
+    if failures:
+        print(f"{failures} flow(s) have queries without a usable index.")
+        return 1
+    print("All hot queries use indexes.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
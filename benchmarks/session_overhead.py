@@ -0,0 +1,64 @@
+"""
+Benchmark the per-request cost of sessions and authentication.
+
+An authenticated client browses a product page under each SESSION_PROFILE
+(see the settings) and the queries and latency per request are reported.
+The page itself comes from the catalog cache, so what is left is the
+session, the user and the cart badge.
+
+    python -m benchmarks.session_overhead --requests 500
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.environment import setup_django
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help="Requests timed per profile.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.urls import reverse
+    from online_store.instrumentation import percentile
+    from products.models import Product
+
+    setup_test_environment()
+    product = Product.objects.create(
+        name='Benchmark product', description='Session overhead', price=10,
+        category=Product.LAPTOP, inventory=100,
+    )
+    user = User.objects.create_user('session-shopper')
+    url = reverse('product_detail', args=[product.pk])
+
+    print(f"{'profile':>8} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for profile, (engine, user_cache) in settings.SESSION_PROFILES.items():
+        settings.SESSION_ENGINE = engine
+        settings.AUTH_USER_CACHE = user_cache
+        # A new client builds its middleware, and so its session store, anew
+        client = Client()
+        client.force_login(user)
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        # The query log is reset when the next request starts
+        query_count = len(queries)
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"Request failed with HTTP {response.status_code}")
+        latencies.sort()
+        print(f"{profile:>8} {query_count:>8} {percentile(latencies, 50):>9.2f} {percentile(latencies, 95):>9.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
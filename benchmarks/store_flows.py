@@ -0,0 +1,207 @@
+"""
+Benchmark suite for the main store flows.
+
+Seeds synthetic catalogs of growing size and shoppers with carts of
+different sizes on a throwaway SQLite database, then drives the views
+through Django's test client. For every flow it reports throughput,
+latency percentiles and queries per request, and can save the numbers
+as a baseline or diff them against one.
+
+    python -m benchmarks.store_flows --catalog-sizes 1000 10000 100000
+    python -m benchmarks.store_flows --save-baseline benchmarks/baseline.json
+    python -m benchmarks.store_flows --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from benchmarks.environment import setup_django
+
+# Untimed requests per flow that warm caches and connections first
+WARMUP_REQUESTS = 5
+
+def measure(flow, iterations, prepare=None):
+    """
+    Run a flow repeatedly and return its latency and query statistics.
+    
+    prepare() runs before every iteration and is not timed.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from online_store.instrumentation import percentile
+
+    for _ in range(WARMUP_REQUESTS):
+        if prepare is not None:
+            prepare()
+        flow()
+    latencies, queries = [], []
+    total = 0.0
+    for _ in range(iterations):
+        if prepare is not None:
+            prepare()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = flow()
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError(f"Flow failed with HTTP {response.status_code}")
+        total += elapsed
+        latencies.append(elapsed * 1000)
+        queries.append(len(captured))
+    latencies.sort()
+    return {
+        'requests': iterations,
+        'throughput': round(iterations / total, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': round(sum(queries) / len(queries), 2),
+    }
+
+def seed_catalog(size, rng):
+    """
+    Grow the catalog to the given number of products.
+    """
+    from products.models import Product
+    categories = [value for value, label in Product.CATEGORY_CHOICES]
+    existing = Product.objects.count()
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f'Product {number:06d}', description=f'Synthetic product number {number}',
+                price=rng.randint(10, 2000), category=categories[number % len(categories)],
+                inventory=1_000_000,
+            )
+            for number in range(existing, size)
+        ],
+        batch_size=2000,
+    )
+    from products.facets import refresh_facets
+    from products.search import rebuild_search_index
+    rebuild_search_index()
+    refresh_facets()
+
+def run_suite(catalog_sizes, cart_sizes, iterations, seed):
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.urls import reverse
+    from products.cache import get_catalog_cache
+    from products.models import Product
+    from cart.models import Cart, CartItem
+
+    rng = random.Random(seed)
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    categories = [value for value, label in Product.CATEGORY_CHOICES]
+    results = {}
+
+    def record(name, stats):
+        results[name] = stats
+        print(f"{name:44} {stats['throughput']:>9} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['queries']:>8}")
+
+    print(f"{'flow':44} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for catalog_size in catalog_sizes:
+        seed_catalog(catalog_size, rng)
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        get_catalog_cache().clear()
+        anonymous = Client()
+        tag = f"catalog={catalog_size}"
+
+        record(f"product_list by category [{tag}]", measure(
+            lambda: anonymous.get(reverse('product_list'), {'category': rng.choice(categories)}), iterations))
+        record(f"product_list uncached [{tag}]", measure(
+            lambda: anonymous.get(reverse('product_list'), {'category': rng.choice(categories)}), iterations,
+            prepare=get_catalog_cache().clear))
+        record(f"product_detail [{tag}]", measure(
+            lambda: anonymous.get(reverse('product_detail', args=[rng.choice(product_ids)])), iterations))
+
+        for cart_size in cart_sizes:
+            user, created = User.objects.get_or_create(username=f'shopper{cart_size}')
+            client = Client()
+            client.force_login(user)
+            cart, created = Cart.objects.get_or_create(user=user)
+
+            def fill_cart(cart=cart, cart_size=cart_size):
+                cart.items.all().delete()
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product_id=product_id, quantity=1)
+                    for product_id in rng.sample(product_ids, cart_size)
+                ])
+                cart.recalculate_totals()
+
+            fill_cart()
+            tag = f"catalog={catalog_size},cart={cart_size}"
+            record(f"add_to_cart ajax [{tag}]", measure(
+                lambda: client.get(reverse('add_to_cart', args=[rng.choice(product_ids)]), **ajax),
+                iterations, prepare=fill_cart))
+            target = {}
+
+            def pick_item(cart=cart, target=target):
+                target['url'] = reverse('update_cart', args=[cart.items.values_list('id', flat=True).first()])
+
+            record(f"update_cart ajax [{tag}]", measure(
+                lambda: client.post(target['url'], {'quantity': rng.randint(1, 5)}, **ajax),
+                iterations, prepare=pick_item))
+            record(f"check_cart_status [{tag}]", measure(
+                lambda: client.get(reverse('check_cart_status'), **ajax), iterations))
+            record(f"cart_detail [{tag}]", measure(
+                lambda: client.get(reverse('cart_detail')), iterations))
+            record(f"checkout [{tag}]", measure(
+                lambda: client.post(reverse('checkout')), iterations, prepare=fill_cart))
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change against a baseline and return the names of regressed flows.
+    """
+    regressions = []
+    print(f"\n{'flow':44} {'p95 ms':>9} {'base':>9} {'change':>8} {'queries':>8} {'base':>6}")
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:44} {stats['p95_ms']:>9} {'-':>9} {'new':>8} {stats['queries']:>8} {'-':>6}")
+            continue
+        change = (stats['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+        regressed = change > tolerance or stats['queries'] > base['queries']
+        marker = '  <-- regression' if regressed else ''
+        print(f"{name:44} {stats['p95_ms']:>9} {base['p95_ms']:>9} {change:>+7.1f}% "
+              f"{stats['queries']:>8} {base['queries']:>6}{marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--catalog-sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Catalog sizes to benchmark, in increasing order.")
+    parser.add_argument('--cart-sizes', type=int, nargs='+', default=[1, 10, 50], help="Cart sizes in lines.")
+    parser.add_argument('--iterations', type=int, default=200, help="Requests per flow.")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed for the synthetic data.")
+    parser.add_argument('--baseline', help="JSON file of a previous run to diff against.")
+    parser.add_argument('--save-baseline', help="Write the results of this run to a JSON file.")
+    parser.add_argument('--tolerance', type=float, default=25.0,
+                        help="Allowed p95 latency increase over the baseline, in percent.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+    results = run_suite(sorted(args.catalog_sizes), args.cart_sizes, args.iterations, args.seed)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} flow(s) regressed.")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
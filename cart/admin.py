@@ -0,0 +1,22 @@
+from django.contrib import admin
+from .models import Order, OrderItem
+
+class OrderItemInline(admin.TabularInline):
+    """
+    Read-only order lines shown on the order page.
+    """
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ('product', 'product_name', 'price', 'quantity')
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Order model.
+    """
+    list_display = ('id', 'user', 'created_at', 'total_items', 'total_price')
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('user', 'created_at', 'total_items', 'total_price')
+    inlines = [OrderItemInline]
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from products.models import Product
+from products.signals import catalog_changed
+from tasks.queue import enqueue_many
+from .models import CartItem, Order, OrderItem, Reservation
+
+class InsufficientStock(Exception):
+    """
+    Raised when one or more cart lines ask for more units than are in stock.
+    
+    shortages is a list of (cart_item, available_units) pairs.
+    """
+    def __init__(self, shortages):
+        super().__init__("Insufficient stock for %d item(s)." % len(shortages))
+        self.shortages = shortages
+
+class _Rollback(Exception):
+    pass
+
+def place_order(cart):
+    """
+    Turn the cart into an Order, take the units out of stock and clear the cart.
+    
+    Everything happens in one transaction with a fixed number of queries.
+    Inventory is decremented with a single conditional UPDATE that only
+    matches rows still holding enough stock beyond what other carts hold,
+    so concurrent checkouts can never oversell. The same UPDATE consumes
+    the cart's own holds. If any line fails, nothing is written and
+    InsufficientStock is raised. Follow-up work (ORDER_PLACED_TASKS) is
+    queued in the same transaction and runs in the background. Returns
+    the new Order, or None for an empty cart.
+    """
+    holds = {}
+    try:
+        with transaction.atomic():
+            items = list(
+                CartItem.objects.select_for_update().select_related('product').filter(cart=cart)
+            )
+            if not items:
+                return None
+            product_ids = [item.product_id for item in items]
+            holds = dict(
+                Reservation.objects.select_for_update()
+                .filter(cart=cart, product_id__in=product_ids).values_list('product_id', 'quantity')
+            )
+            quantities = Case(
+                *[When(pk=item.product_id, then=item.quantity) for item in items], output_field=IntegerField(),
+            )
+            held = Case(
+                *[When(pk=product_id, then=quantity) for product_id, quantity in holds.items()],
+                default=0, output_field=IntegerField(),
+            )
+            updated = Product.objects.filter(
+                pk__in=product_ids,
+                inventory__gte=F('reserved') - held + quantities,
+            ).update(
+                inventory=F('inventory') - quantities,
+                reserved=Greatest(F('reserved') - held, 0),
+                updated_at=timezone.now(),
+            )
+            if updated != len(items):
+                raise _Rollback
+            Reservation.objects.filter(cart=cart, product_id__in=product_ids).delete()
+            order = Order.objects.create(
+                user_id=cart.user_id,
+                total_items=sum(item.quantity for item in items),
+                total_price=sum(item.get_cost() for item in items),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=item.product_id,
+                    product_name=item.product.name,
+                    price=item.product.price,
+                    quantity=item.quantity,
+                )
+                for item in items
+            ])
+            cart.clear()
+            enqueue_many([
+                (name, {'order_id': order.id}, f'{name}:{order.id}') for name in settings.ORDER_PLACED_TASKS
+            ])
+            catalog_changed.send(sender=Product, product_ids=product_ids, stock_only=True)
+    except _Rollback:
+        raise InsufficientStock(_find_shortages(items, holds))
+    return order
+
+def _find_shortages(items, holds):
+    """
+    Return (item, available_units) for every line that exceeds the stock the cart can get.
+    
+    That is the unreserved stock plus the units the cart holds itself.
+    """
+    available = {
+        pk: max(inventory - reserved, 0) + holds.get(pk, 0)
+        for pk, inventory, reserved in Product.objects.filter(
+            pk__in=[item.product_id for item in items]
+        ).values_list('pk', 'inventory', 'reserved')
+    }
+    return [
+        (item, available.get(item.product_id, 0))
+        for item in items
+        if item.quantity > available.get(item.product_id, 0)
+    ]
@@ -1,15 +1,15 @@
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .utils import get_cart_summary
 
 def cart_processor(request):
     """
     Context processor to make cart data available to all templates.
     """
-    if request.user.is_authenticated:
-        # Get or create cart for the user
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        return {
-            'cart': cart,
-            'cart_total_items': cart.get_total_items(),
-            'cart_total_price': cart.get_total_price()
-        }
-    return {'cart': None, 'cart_total_items': 0, 'cart_total_price': 0}
\ No newline at end of file
+    summary = get_cart_summary(request)
+    return {
+        'cart': summary.cart,
+        'cart_summary': summary,
+        'cart_total_items': summary.total_items,
+        # An anonymous cart has to load its products to know the price
+        'cart_total_price': SimpleLazyObject(lambda: summary.total_price),
+    }
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from cart.utils import get_drifted_carts, reconcile_cart_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored cart totals from the cart items and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report carts whose totals drifted.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            drifted, actual_items, actual_price = get_drifted_carts()
+            self.stdout.write(f"{drifted.count()} cart(s) have drifted totals.")
+            return
+        count = reconcile_cart_totals()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {count} cart(s)."))
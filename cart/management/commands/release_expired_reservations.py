@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from cart.models import Reservation
+
+
+class Command(BaseCommand):
+    help = "Give the stock held by expired cart reservations back, in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Holds released per transaction.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and sweep every INTERVAL seconds instead of once.")
+
+    def handle(self, *args, **options):
+        while True:
+            count = Reservation.objects.release_expired(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Released {count} expired reservation(s)."))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,10 @@
+from django.utils.deprecation import MiddlewareMixin
+from .session import save_session_cart
+
+class SessionCartMiddleware(MiddlewareMixin):
+    """
+    Write the anonymous visitor's cart cookie when the cart changed.
+    """
+    def process_response(self, request, response):
+        save_session_cart(request, response)
+        return response
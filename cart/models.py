@@ -1,27 +1,165 @@
-from django.db import models
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from functools import cached_property
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest, Least
 from django.contrib.auth.models import User
+from django.utils import timezone
+from products.cache import invalidate_stock
+from products.events import publish_product_changes
 from products.models import Product
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at  = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Running totals, maintained alongside every CartItem change
+    total_items = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    
+    # Number of different products the cart can hold (see SessionCart)
+    max_lines = None
     
     def __str__(self):
         return f"Cart for {self.user.username}"
     
     def get_total_price(self):
-        return sum(item.get_cost() for item in self.items.all())
+        """
+        Compute the total price from the line items, ignoring the stored total.
+        """
+        total = self.items.aggregate(total=Sum(F('quantity') * F('product__price')))['total']
+        return Decimal(total or 0).quantize(Decimal('0.01'))
     
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        """
+        Compute the number of units from the line items, ignoring the stored total.
+        """
+        return self.items.aggregate(total=Sum('quantity'))['total'] or 0
     
     def get_cart_items(self):
 
-        return self.items.all()
+        return self.items.select_related('product')
+    
+    def get_summary(self):
+        """
+        Return a CartSummary with the line items and totals of this cart.
+        """
+        return CartSummary(self)
+    
+    def adjust_totals(self, quantity, price):
+        """
+        Add quantity units at the given unit price to the stored totals.
+        
+        The update is applied with F() expressions so concurrent changes to
+        the same cart are not lost; negative quantities remove units.
+        """
+        amount = price * quantity
+        Cart.objects.filter(pk=self.pk).update(
+            total_items=F('total_items') + quantity,
+            total_price=F('total_price') + amount,
+            updated_at=timezone.now(),
+        )
+        self.total_items += quantity
+        self.total_price += amount
+    
+    def recalculate_totals(self):
+        """
+        Recompute the stored totals from the line items.
+        """
+        self.total_items = self.get_total_items()
+        self.total_price = self.get_total_price()
+        self.save(update_fields=['total_items', 'total_price', 'updated_at'])
+    
+    def get_quantities(self, product_ids):
+        """
+        Return {product_id: quantity} for the given products that are in the cart.
+        """
+        return dict(self.items.filter(product_id__in=product_ids).values_list('product_id', 'quantity'))
+    
+    def get_held_quantities(self, product_ids):
+        """
+        Return {product_id: units} held by this cart for the given products.
+        """
+        return dict(self.reservations.filter(product_id__in=product_ids).values_list('product_id', 'quantity'))
+    
+    def get_available(self, product):
+        """
+        Return how many units of a product this cart can have: its own hold plus the unreserved stock.
+        """
+        return product.available + self.get_held_quantities([product.id]).get(product.id, 0)
+    
+    def set_quantities(self, quantities):
+        """
+        Set the quantity of many lines at once; 0 removes a line.
+        
+        The units are held first, and lines get the units that could be
+        held. New and changed lines are written with a single upsert,
+        removed lines with a single delete, and the totals are recomputed
+        afterwards. Returns {product_id: quantity} as written.
+        """
+        with transaction.atomic():
+            quantities = Reservation.objects.hold(self, quantities)
+            lines = [
+                CartItem(cart=self, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items() if quantity > 0
+            ]
+            removed = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+            if lines:
+                CartItem.objects.bulk_create(
+                    lines, update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity'],
+                )
+            if removed:
+                self.items.filter(product_id__in=removed).delete()
+            self.recalculate_totals()
+        return quantities
+    
+    def add_item(self, product, quantity):
+        """
+        Create a line item for a product that is not in the cart yet.
+        
+        Returns None if no units could be held for the cart.
+        """
+        with transaction.atomic():
+            quantity = Reservation.objects.hold(self, {product.id: quantity})[product.id]
+            if not quantity:
+                return None
+            item = CartItem.objects.create(cart=self, product=product, quantity=quantity)
+            self.adjust_totals(quantity, product.price)
+        return item
+    
+    def set_item_quantity(self, item, quantity):
+        """
+        Change the quantity of an existing line item to the units that could be held.
+        """
+        with transaction.atomic():
+            quantity = Reservation.objects.hold(self, {item.product_id: quantity})[item.product_id]
+            if not quantity:
+                self.remove_item(item)
+                return
+            delta = quantity - item.quantity
+            item.quantity = quantity
+            item.save(update_fields=['quantity'])
+            self.adjust_totals(delta, item.product.price)
+    
+    def remove_item(self, item):
+        """
+        Delete a line item from the cart and release its hold.
+        """
+        with transaction.atomic():
+            Reservation.objects.hold(self, {item.product_id: 0})
+            item.delete()
+            self.adjust_totals(-item.quantity, item.product.price)
     
     def clear(self):
-        self.items.all().delete()
+        with transaction.atomic():
+            Reservation.objects.release(self.reservations.all())
+            self.items.all().delete()
+            self.total_items = 0
+            self.total_price = Decimal('0.00')
+            self.save(update_fields=['total_items', 'total_price', 'updated_at'])
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
@@ -36,4 +174,243 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name} in {self.cart}"
     
     def get_cost(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.product.price * self.quantity
+
+def stock_changed(product_ids):
+    """
+    Push the new stock of the given products to open pages and drop their cached stock once committed.
+    """
+    if product_ids:
+        publish_product_changes(product_ids)
+        transaction.on_commit(lambda: invalidate_stock(product_ids))
+
+class ReservationManager(models.Manager):
+    def hold(self, cart, quantities):
+        """
+        Hold {product_id: units} for a cart, replacing its current holds of those products.
+        
+        Holds are created, grown, shrunk or dropped (0 units) and their
+        expiry is pushed CART_RESERVATION_TTL seconds out. Units of all the
+        products are taken with one UPDATE of Product.reserved that never
+        goes past the inventory, so carts can never hold more than the stock
+        together; if fewer units are left than asked for, the hold gets what
+        is left. The query count does not grow with the number of products.
+        Returns {product_id: units held}.
+        """
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.CART_RESERVATION_TTL)
+        with transaction.atomic(savepoint=False):
+            held = dict(
+                self.select_for_update().filter(cart=cart, product_id__in=list(quantities))
+                .values_list('product_id', 'quantity')
+            )
+            granted, wanted, released = {}, {}, Counter()
+            for product_id, quantity in quantities.items():
+                current = held.get(product_id, 0)
+                if quantity > current:
+                    wanted[product_id] = quantity - current
+                elif quantity < current:
+                    released[product_id] = current - quantity
+                granted[product_id] = min(quantity, current)
+            taken = self._take(wanted, now) if wanted else {}
+            for product_id in wanted:
+                granted[product_id] += taken.get(product_id, 0)
+            stock_changed([
+                product_id for product_id, quantity in granted.items() if quantity != held.get(product_id, 0)
+            ])
+            if released:
+                self._give_back(released, now)
+            holds = [
+                self.model(cart=cart, product_id=product_id, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in granted.items() if quantity > 0
+            ]
+            if holds:
+                self.bulk_create(
+                    holds, update_conflicts=True, unique_fields=['cart', 'product'],
+                    update_fields=['quantity', 'expires_at'],
+                )
+            dropped = [product_id for product_id, quantity in granted.items() if quantity == 0 and product_id in held]
+            if dropped:
+                self.filter(cart=cart, product_id__in=dropped).delete()
+        return granted
+    
+    def release(self, reservations):
+        """
+        Delete the given holds and give their units back; returns the number of holds released.
+        """
+        with transaction.atomic(savepoint=False):
+            rows = list(reservations.select_for_update().values_list('pk', 'product_id', 'quantity'))
+            if not rows:
+                return 0
+            units = Counter()
+            for pk, product_id, quantity in rows:
+                units[product_id] += quantity
+            self._give_back(units, timezone.now())
+            self.filter(pk__in=[row[0] for row in rows]).delete()
+            stock_changed(list(units))
+        return len(rows)
+    
+    def release_expired(self, batch_size=1000):
+        """
+        Release every hold that has expired, batch_size holds per transaction.
+        
+        Returns the number of holds released.
+        """
+        now = timezone.now()
+        released = 0
+        while True:
+            ids = list(self.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return released
+            # Holds renewed since they were read are left alone
+            released += self.release(self.filter(pk__in=ids, expires_at__lte=now))
+    
+    def _take(self, units, now):
+        """
+        Add up to {product_id: units} to the reserved counters with one UPDATE.
+        
+        The products are locked and read first to work out what each can
+        give; the UPDATE clamps to the inventory as well, so it can never
+        oversell. Returns {product_id: units taken}.
+        """
+        stock = (
+            Product.objects.select_for_update().filter(pk__in=list(units)).order_by('pk')
+            .values_list('pk', 'inventory', 'reserved')
+        )
+        taken = {
+            product_id: min(units[product_id], inventory - reserved)
+            for product_id, inventory, reserved in stock if inventory > reserved
+        }
+        if taken:
+            wanted = Case(
+                *[When(pk=product_id, then=Value(count)) for product_id, count in taken.items()],
+                output_field=IntegerField(),
+            )
+            Product.objects.filter(pk__in=list(taken)).update(
+                reserved=F('reserved') + Least(wanted, Greatest(F('inventory') - F('reserved'), Value(0))),
+                updated_at=now,
+            )
+        return taken
+    
+    def _give_back(self, units, now):
+        """
+        Subtract {product_id: units} from the reserved counters with one UPDATE.
+        """
+        Product.objects.filter(pk__in=list(units)).update(
+            reserved=Greatest(
+                F('reserved') - Case(
+                    *[When(pk=product_id, then=Value(count)) for product_id, count in units.items()],
+                    default=Value(0), output_field=IntegerField(),
+                ),
+                Value(0),
+            ),
+            updated_at=now,
+        )
+
+class Reservation(models.Model):
+    """
+    Units of a product held for a cart until expires_at.
+    
+    Every hold is also counted in Product.reserved, so change holds only
+    through Reservation.objects to keep the two in step. Expired holds
+    keep counting until release_expired_reservations gives them back (or
+    their cart touches them again, which renews them).
+    """
+    cart = models.ForeignKey(Cart, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    
+    objects = ReservationManager()
+    
+    class Meta:
+        unique_together = ('cart', 'product')
+        indexes = [
+            # Expired holds found by the sweeper
+            models.Index(fields=['expires_at'], name='cart_reservation_expires_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product} held for {self.cart} until {self.expires_at}"
+
+class Order(models.Model):
+    """
+    A placed order, with prices and quantities snapshotted from the cart.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
+    created_at = models.DateTimeField(auto_now_add=True)
+    total_items = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='cart_order_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Order #{self.id} by {self.user.username}"
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    # Kept when the product is deleted; name and price are snapshots
+    product = models.ForeignKey(Product, related_name='order_items', null=True, on_delete=models.SET_NULL)
+    product_name = models.CharField(max_length=200)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} in order #{self.order_id}"
+    
+    def get_cost(self):
+        return self.price * self.quantity
+
+class CartSummary:
+    """
+    Line items and totals of a cart.
+    
+    Totals come from the cart's stored counters; the line items are loaded
+    with a single query the first time they are needed.
+    """
+    def __init__(self, cart):
+        self.cart = cart
+        self.total_items = cart.total_items
+        self.total_price = cart.total_price
+    
+    @cached_property
+    def items(self):
+        return list(self.cart.get_cart_items())
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __len__(self):
+        return len(self.items)
+    
+    @cached_property
+    def items_with_available(self):
+        """
+        Return (item, units the cart can have of its product) pairs, as Cart.get_available counts them.
+        
+        The holds of all the lines are read with one query.
+        """
+        held = self.cart.get_held_quantities([item.product_id for item in self.items])
+        return [(item, item.product.available + held.get(item.product_id, 0)) for item in self.items]
+    
+    def get_item(self, item_id):
+        """
+        Return the line item with the given id, or None if it is not in the cart.
+        """
+        for item in self.items:
+            if item.id == item_id:
+                return item
+        return None
+    
+    def get_item_for_product(self, product_id):
+        """
+        Return the line item for the given product, raising CartItem.DoesNotExist if absent.
+        """
+        for item in self.items:
+            if item.product_id == product_id:
+                return item
+        raise CartItem.DoesNotExist(f"Product {product_id} is not in {self.cart}.")
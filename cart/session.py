@@ -0,0 +1,167 @@
+"""
+Carts of anonymous visitors.
+
+A SessionCart lives entirely in a signed cookie as "product_id:quantity"
+pairs, so browsing and filling a cart without an account never writes to
+the database. SessionCartMiddleware writes the cookie back when the cart
+changed, and the cart is merged into the visitor's persistent Cart when
+they log in or sign up (see cart.signals.merge_cart_on_login).
+"""
+from decimal import Decimal
+from functools import cached_property
+from django.conf import settings
+from products.models import Product
+from .models import CartSummary
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'cart.session'
+
+# Anonymous carts are forgotten after this many seconds without a change
+COOKIE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Keeps the cookie well below the 4 KB browser limit
+MAX_LINES = 100
+
+class SessionCartItem:
+    """
+    A line of a SessionCart, with the CartItem attributes the views and templates use.
+
+    Lines have no row of their own, so the product id doubles as the item id.
+    """
+    def __init__(self, product, quantity):
+        self.id = product.id
+        self.product = product
+        self.product_id = product.id
+        self.quantity = quantity
+
+    def get_cost(self):
+        return self.product.price * self.quantity
+
+class SessionCart:
+    """
+    Cart of an anonymous visitor, kept in a signed cookie.
+
+    It offers the same cart-changing methods as Cart, applied to an in-memory
+    {product_id: quantity} mapping instead of database rows. It holds no
+    stock: its lines are held when they are merged into a Cart at login.
+    The cookie holds at most max_lines products; the views refuse to add
+    more.
+    """
+    max_lines = MAX_LINES
+
+    def __init__(self, lines=None):
+        self.lines = dict(lines or {})
+        self.modified = False
+
+    def __str__(self):
+        return "Anonymous cart"
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Load the cart from the request cookie, ignoring a missing or tampered one.
+        """
+        value = request.get_signed_cookie(COOKIE_NAME, default='', salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        return cls(decode_lines(value))
+
+    def encode(self):
+        return encode_lines(self.lines)
+
+    @property
+    def total_items(self):
+        return sum(self.lines.values())
+
+    def get_cart_items(self):
+        products = Product.objects.in_bulk(list(self.lines))
+        # Products deleted since they were added simply drop out of the cart
+        return [
+            SessionCartItem(products[product_id], quantity)
+            for product_id, quantity in self.lines.items()
+            if product_id in products
+        ]
+
+    def get_summary(self):
+        return SessionCartSummary(self)
+
+    def get_quantities(self, product_ids):
+        """
+        Return {product_id: quantity} for the given products that are in the cart.
+        """
+        return {product_id: self.lines[product_id] for product_id in product_ids if product_id in self.lines}
+
+    def get_held_quantities(self, product_ids):
+        return {}
+
+    def get_available(self, product):
+        return product.available
+
+    def set_quantities(self, quantities):
+        """
+        Set the quantity of many lines at once; 0 removes a line.
+        """
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                self.lines[product_id] = quantity
+            else:
+                self.lines.pop(product_id, None)
+        self.modified = True
+        return quantities
+
+    def add_item(self, product, quantity):
+        self.set_quantities({product.id: quantity})
+        return SessionCartItem(product, quantity)
+
+    def set_item_quantity(self, item, quantity):
+        item.quantity = quantity
+        self.set_quantities({item.product_id: quantity})
+
+    def remove_item(self, item):
+        self.set_quantities({item.product_id: 0})
+
+    def clear(self):
+        self.lines = {}
+        self.modified = True
+
+class SessionCartSummary(CartSummary):
+    """
+    CartSummary of a SessionCart.
+
+    The item count comes from the cookie alone; the products, and with them
+    the total price, are loaded with one query only when they are needed.
+    """
+    def __init__(self, cart):
+        self.cart = cart
+        self.total_items = cart.total_items
+
+    @cached_property
+    def total_price(self):
+        return sum((item.get_cost() for item in self.items), Decimal('0.00'))
+
+def encode_lines(lines):
+    return ','.join(f'{product_id}:{quantity}' for product_id, quantity in lines.items())
+
+def decode_lines(value):
+    """
+    Parse "product_id:quantity,..." into a dict, dropping malformed pairs.
+    """
+    lines = {}
+    for pair in value.split(',')[:MAX_LINES] if value else []:
+        product_id, _, quantity = pair.partition(':')
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            lines[int(product_id)] = int(quantity)
+    return lines
+
+def save_session_cart(request, response):
+    """
+    Write the visitor's cart cookie if the cart changed during the request.
+    """
+    cart = getattr(request, '_session_cart', None)
+    if cart is None or not cart.modified:
+        return
+    if cart.lines:
+        response.set_signed_cookie(
+            COOKIE_NAME, encode_lines(cart.lines), salt=COOKIE_SALT,
+            max_age=COOKIE_MAX_AGE, secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+        )
+    else:
+        response.delete_cookie(COOKIE_NAME, samesite='Lax')
@@ -0,0 +1,73 @@
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, QuerySet, Subquery, Value
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import pre_delete, pre_save, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from products.models import Product
+from products.signals import catalog_changed
+from .models import Cart, CartItem, Reservation
+from .utils import merge_session_cart, reconcile_cart_totals, remove_products_from_totals
+
+@receiver(pre_save, sender=Product)
+def remember_old_price(sender, instance, update_fields=None, **kwargs):
+    """
+    Remember the stored price of a product before it is saved.
+    """
+    instance._old_price = None
+    if instance.pk is None or (update_fields is not None and 'price' not in update_fields):
+        return
+    instance._old_price = Product.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, **kwargs):
+    """
+    Shift the stored total of every cart holding the product by the price difference.
+    """
+    old_price = getattr(instance, '_old_price', None)
+    if created or old_price is None or old_price == instance.price:
+        return
+    quantity = CartItem.objects.filter(cart=OuterRef('pk'), product=instance).values('quantity')[:1]
+    difference = ExpressionWrapper(
+        Subquery(quantity) * Value(instance.price - old_price),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    Cart.objects.filter(items__product=instance).update(
+        total_price=F('total_price') + difference,
+        updated_at=timezone.now(),
+    )
+
+@receiver(pre_delete, sender=Product)
+def remove_deleted_product_from_carts(sender, instance, origin=None, **kwargs):
+    """
+    Take the lines of a deleted product out of the stored cart totals before the cascade removes them.
+    """
+    if isinstance(origin, QuerySet):
+        # products.bulk.delete_products adjusts the carts of all its products at once
+        return
+    remove_products_from_totals([instance.pk])
+
+@receiver(catalog_changed)
+def reprice_carts_in_bulk(sender, repriced_ids=None, **kwargs):
+    """
+    Fix the stored totals of carts holding products repriced by a bulk update.
+    
+    Bulk updates bypass post_save, so reprice_carts never sees them; senders
+    pass the repriced products as repriced_ids.
+    """
+    if repriced_ids:
+        reconcile_cart_totals(Cart.objects.filter(items__product_id__in=repriced_ids).distinct())
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """
+    Merge the anonymous cart of the visitor into their Cart when they log in or sign up.
+    """
+    if request is not None:
+        merge_session_cart(request, user)
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+    """
+    Give the units held by a cart back before the cascade deletes its holds.
+    """
+    Reservation.objects.release(instance.reservations.all())
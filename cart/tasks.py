@@ -0,0 +1,15 @@
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from tasks.queue import task
+from .models import Order
+
+@task
+def send_order_confirmation(order_id):
+    """
+    Email the customer a receipt of their order.
+    """
+    order = Order.objects.select_related('user').prefetch_related('items').filter(pk=order_id).first()
+    if order is None or not order.user.email:
+        return
+    body = render_to_string('cart/emails/order_confirmation.txt', {'order': order})
+    send_mail(f"Your order #{order.id}", body, None, [order.user.email])
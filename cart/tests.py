@@ -0,0 +1,270 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from benchmarks.query_plans import explain, find_problems
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.signing import get_cookie_signer
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from products.bulk import delete_products
+from products.cache import get_catalog_cache
+from products.models import Product
+from .checkout import InsufficientStock, place_order
+from .models import Cart, CartItem
+from .session import COOKIE_NAME, COOKIE_SALT, MAX_LINES, decode_lines
+
+
+class DeletedProductTotalsTests(TestCase):
+    """
+    Deleting a product takes its lines out of the stored cart totals.
+    """
+    def setUp(self):
+        self.kept = Product.objects.create(
+            name='Kept', description='Stays', price=Decimal('10.00'), category=Product.LAPTOP, inventory=10,
+        )
+        self.removed = Product.objects.create(
+            name='Removed', description='Goes', price=Decimal('20.00'), category=Product.LAPTOP, inventory=10,
+        )
+        self.cart = Cart.objects.create(user=User.objects.create_user('shopper'))
+        self.cart.add_item(self.kept, 2)
+        self.cart.add_item(self.removed, 1)
+    
+    def assertTotalsMatchLines(self, items, price):
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.total_items, items)
+        self.assertEqual(self.cart.total_price, Decimal(price))
+        self.assertEqual(self.cart.get_total_items(), items)
+        self.assertEqual(self.cart.get_total_price(), Decimal(price))
+    
+    def test_single_delete(self):
+        self.removed.delete()
+        self.assertTotalsMatchLines(2, '20.00')
+    
+    def test_bulk_delete(self):
+        delete_products(Product.objects.filter(pk=self.removed.pk))
+        self.assertTotalsMatchLines(2, '20.00')
+    
+    def test_other_carts_untouched(self):
+        other = Cart.objects.create(user=User.objects.create_user('browser'))
+        other.add_item(self.kept, 1)
+        self.removed.delete()
+        other.refresh_from_db()
+        self.assertEqual((other.total_items, other.total_price), (1, Decimal('10.00')))
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Buyers checking out the same product at once from separate connections never oversell it.
+    """
+    buyers = 40
+    stock = 15
+    
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Contested', description='Race', price=Decimal('10.00'), category=Product.LAPTOP,
+            inventory=self.stock,
+        )
+        self.carts = []
+        for number in range(self.buyers):
+            cart = Cart.objects.create(user=User.objects.create(username=f'buyer{number}'))
+            # Lines are written without holds, so the buyers race in place_order
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            cart.recalculate_totals()
+            self.carts.append(cart)
+    
+    def checkout(self, cart):
+        try:
+            self.start.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            while True:
+                try:
+                    return place_order(cart).total_items
+                except InsufficientStock:
+                    return 0
+                except OperationalError:
+                    # The shared in-memory test database reports lock contention
+                    # instead of waiting; back off and retry like a client would
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+    
+    def test_no_oversell(self):
+        threads = 8
+        self.start = threading.Barrier(threads)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            sold = sum(pool.map(self.checkout, self.carts))
+        self.product.refresh_from_db()
+        self.assertEqual(sold, self.stock)
+        self.assertEqual(self.product.inventory, 0)
+        self.assertEqual(self.product.reserved, 0)
+
+
+class SessionCartLimitTests(TestCase):
+    """
+    Anonymous carts refuse products beyond MAX_LINES instead of dropping lines from the cookie.
+    """
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(
+                name=f'Line {number}', description='Limit', price=Decimal('1.00'), category=Product.LAPTOP, inventory=5,
+            )
+            for number in range(MAX_LINES + 1)
+        ])
+        *self.products, self.extra = Product.objects.order_by('pk')
+        response = self.batch([{'product_id': product.pk, 'quantity': 1} for product in self.products])
+        self.assertTrue(response.json()['success'])
+    
+    def batch(self, operations):
+        return self.client.post(
+            reverse('batch_update_cart'), json.dumps({'operations': operations}), content_type='application/json',
+        )
+    
+    def cookie_lines(self):
+        signer = get_cookie_signer(salt=COOKIE_NAME + COOKIE_SALT)
+        return decode_lines(signer.unsign(self.client.cookies[COOKIE_NAME].value))
+    
+    def test_add_to_cart(self):
+        response = self.client.get(reverse('add_to_cart', args=[self.extra.pk]), **self.ajax)
+        self.assertFalse(response.json()['success'])
+        self.assertIn(f"at most {MAX_LINES}", response.json()['message'])
+        # Lines already in the cart can still change
+        response = self.client.get(reverse('add_to_cart', args=[self.products[0].pk]), **self.ajax)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(len(self.cookie_lines()), MAX_LINES)
+        self.assertNotIn(self.extra.pk, self.cookie_lines())
+    
+    def test_batch_update_cart(self):
+        results = self.batch([{'product_id': self.extra.pk, 'quantity': 1}]).json()['results']
+        self.assertFalse(results[0]['success'])
+        # Removing a line makes room in the same batch
+        results = self.batch([
+            {'product_id': self.products[0].pk, 'quantity': 0, 'mode': 'set'},
+            {'product_id': self.extra.pk, 'quantity': 1},
+        ]).json()['results']
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertIn(self.extra.pk, self.cookie_lines())
+        self.assertEqual(len(self.cookie_lines()), MAX_LINES)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """
+    Cart views stay within VIEW_QUERY_BUDGETS on a cold cache.
+    """
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    
+    def setUp(self):
+        self.products = [
+            Product.objects.create(
+                name=f'Budget {number}', description='Budget', price=Decimal('10.00'),
+                category=Product.LAPTOP, inventory=5,
+            )
+            for number in range(10)
+        ]
+        self.user = User.objects.create_user('shopper')
+        self.client.force_login(self.user)
+    
+    def request(self, method, url, *args, **kwargs):
+        get_catalog_cache().clear()
+        caches['sessions'].clear()
+        response = getattr(self.client, method)(url, *args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return response
+    
+    def fill_cart(self):
+        for product in self.products[:3]:
+            self.client.get(reverse('add_to_cart', args=[product.pk]), **self.ajax)
+    
+    def test_first_visit(self):
+        # The user has no cart yet, so each view creates it
+        for name in ('cart_detail', 'check_cart_status', 'order_history'):
+            Cart.objects.filter(user=self.user).delete()
+            self.request('get', reverse(name), **self.ajax)
+        Cart.objects.filter(user=self.user).delete()
+        self.request('get', reverse('add_to_cart', args=[self.products[0].pk]), **self.ajax)
+    
+    def test_cart_detail(self):
+        self.fill_cart()
+        self.request('get', reverse('cart_detail'))
+        self.request('get', reverse('check_cart_status'), **self.ajax)
+    
+    def test_update_cart(self):
+        self.fill_cart()
+        item = Cart.objects.get(user=self.user).items.first()
+        self.request('post', reverse('update_cart', args=[item.pk]), {'quantity': 2}, **self.ajax)
+    
+    def test_batch_update_cart(self):
+        operations = [{'product_id': product.pk, 'quantity': 2} for product in self.products]
+        self.request(
+            'post', reverse('batch_update_cart'), json.dumps({'operations': operations}),
+            content_type='application/json',
+        )
+    
+    def test_checkout(self):
+        self.fill_cart()
+        self.request('get', reverse('checkout'))
+        self.request('post', reverse('checkout'))
+        self.request('get', reverse('order_history'))
+
+
+class QueryPlanTests(TestCase):
+    """
+    The cart and checkout views read and write through indexes.
+    """
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {number:04d}', description='Query plan', price=10 + number % 90,
+                category=Product.LAPTOP, inventory=10,
+            )
+            for number in range(500)
+        ])
+        cls.product, cls.other = Product.objects.all()[:2]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    
+    def setUp(self):
+        self.user = User.objects.create_user('shopper')
+        self.client.force_login(self.user)
+    
+    def assertUsesIndexes(self, method, url, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, *args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        problems = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if query['sql'].split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                    problems += [(line, query['sql']) for line in find_problems(explain(cursor, query['sql']))]
+        self.assertEqual(problems, [])
+    
+    def test_cart_flows(self):
+        self.assertUsesIndexes('get', reverse('add_to_cart', args=[self.product.pk]), **self.ajax)
+        self.assertUsesIndexes('get', reverse('add_to_cart', args=[self.product.pk]), **self.ajax)
+        self.assertUsesIndexes(
+            'post', reverse('batch_update_cart'),
+            json.dumps({'operations': [{'product_id': self.other.pk, 'quantity': 1}]}),
+            content_type='application/json',
+        )
+        self.assertUsesIndexes('get', reverse('check_cart_status'), **self.ajax)
+        self.assertUsesIndexes('get', reverse('cart_detail'))
+        item = CartItem.objects.get(cart__user=self.user, product=self.product)
+        self.assertUsesIndexes('post', reverse('update_cart', args=[item.pk]), {'quantity': 2}, **self.ajax)
+    
+    def test_checkout_and_orders(self):
+        self.client.get(reverse('add_to_cart', args=[self.product.pk]), **self.ajax)
+        self.assertUsesIndexes('get', reverse('checkout'))
+        self.assertUsesIndexes('post', reverse('checkout'))
+        self.assertUsesIndexes('get', reverse('order_history'))
@@ -5,7 +5,9 @@ urlpatterns = [
     path('', views.cart_detail, name='cart_detail'),
     path('add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('update/<int:item_id>/', views.update_cart, name='update_cart'),
+    path('batch/', views.batch_update_cart, name='batch_update_cart'),
     path('clear/', views.clear_cart, name='clear_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('check-status/', views.check_cart_status, name='check_cart_status'),
+    path('orders/', views.order_history, name='order_history'),
 ]
\ No newline at end of file
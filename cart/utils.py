@@ -0,0 +1,133 @@
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from products.models import Product
+from .models import Cart, CartItem
+from .session import SessionCart
+
+def get_session_cart(request):
+    """
+    Return the cookie-backed cart of the current visitor, loaded at most once per request.
+    """
+    cart = getattr(request, '_session_cart', None)
+    if cart is None:
+        cart = request._session_cart = SessionCart.from_request(request)
+    return cart
+
+def get_cart_summary(request, refresh=False):
+    """
+    Return the CartSummary for the current visitor, computed at most once per request.
+    
+    Logged-in users get their persistent Cart, anonymous visitors the
+    SessionCart from their cookie. Views that change the cart pass
+    refresh=True so that the context processor and the JSON responses see
+    the new totals.
+    """
+    summary = getattr(request, '_cart_summary', None)
+    if summary is None:
+        if request.user.is_authenticated:
+            # The cart id comes with the cached user (users.middleware)
+            cart_id = getattr(request, 'cart_id', None)
+            cart = Cart.objects.filter(pk=cart_id, user=request.user).first() if cart_id else None
+            if cart is None:
+                cart, created = Cart.objects.get_or_create(user=request.user)
+        else:
+            cart = get_session_cart(request)
+        summary = cart.get_summary()
+    elif refresh:
+        summary = summary.cart.get_summary()
+    request._cart_summary = summary
+    return summary
+
+def merge_session_cart(request, user):
+    """
+    Move the visitor's anonymous cart into the persistent Cart of the user.
+    
+    Quantities of products already in the cart are added up and clamped
+    to the stock the cart can hold; everything is held and written with
+    Cart.set_quantities().
+    """
+    session_cart = get_session_cart(request)
+    if not session_cart.lines:
+        return
+    cart, created = Cart.objects.get_or_create(user=user)
+    products = Product.objects.in_bulk(list(session_cart.lines))
+    existing = cart.get_quantities(list(products)) if not created else {}
+    held = cart.get_held_quantities(list(products)) if not created else {}
+    quantities = {}
+    for product_id, quantity in session_cart.lines.items():
+        product = products.get(product_id)
+        available = product.available + held.get(product_id, 0) if product is not None else 0
+        if available > 0:
+            quantities[product_id] = min(existing.get(product_id, 0) + quantity, available)
+    if quantities:
+        cart.set_quantities(quantities)
+    session_cart.clear()
+    request._cart_summary = None
+
+def get_drifted_carts(carts=None):
+    """
+    Return (drifted carts, actual items, actual price) for carts whose stored totals drifted.
+    
+    The actual totals are subquery expressions over the line items, usable
+    in an update() of the returned carts.
+    """
+    items = CartItem.objects.filter(cart=OuterRef('pk')).values('cart')
+    actual_items = Coalesce(
+        Subquery(items.annotate(total=Sum('quantity')).values('total'), output_field=IntegerField()),
+        Value(0),
+    )
+    actual_price = Coalesce(
+        Subquery(
+            items.annotate(total=Sum(F('quantity') * F('product__price'))).values('total'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    carts = Cart.objects.all() if carts is None else carts
+    drifted = carts.annotate(actual_items=actual_items, actual_price=actual_price).filter(
+        ~Q(total_items=F('actual_items')) | ~Q(total_price=F('actual_price'))
+    )
+    return drifted, actual_items, actual_price
+
+def reconcile_cart_totals(carts=None):
+    """
+    Recompute the stored totals of the given carts (all carts by default) that drifted.
+    
+    Returns the number of carts fixed.
+    """
+    drifted, actual_items, actual_price = get_drifted_carts(carts)
+    return Cart.objects.filter(pk__in=drifted.values('pk')).update(
+        total_items=actual_items,
+        total_price=actual_price,
+        updated_at=timezone.now(),
+    )
+
+def remove_products_from_totals(product_ids):
+    """
+    Take the lines of products about to be deleted out of the stored cart totals.
+    
+    Call it before the delete, while the lines still exist; every affected
+    cart is updated with one UPDATE. Returns the number of carts updated.
+    """
+    lines = CartItem.objects.filter(cart=OuterRef('pk'), product_id__in=product_ids).values('cart')
+    items = Coalesce(
+        Subquery(lines.annotate(total=Sum('quantity')).values('total'), output_field=IntegerField()),
+        Value(0),
+    )
+    price = Coalesce(
+        Subquery(
+            lines.annotate(total=Sum(F('quantity') * F('product__price'))).values('total'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    return Cart.objects.filter(
+        pk__in=CartItem.objects.filter(product_id__in=product_ids).values('cart'),
+    ).update(
+        total_items=F('total_items') - items,
+        total_price=F('total_price') - price,
+        updated_at=timezone.now(),
+    )
@@ -1,32 +1,67 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from .models import Cart, CartItem
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+import json
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from .checkout import InsufficientStock, place_order
+from .models import Cart, CartItem, Order
+from .utils import get_cart_summary, get_session_cart
 from products.models import Product
+from products.pagination import KeysetPaginator
 
-@login_required
-def check_cart_status(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = [{'product_id': item.product.id, 'quantity': item.quantity} for item in cart.items.all()]
+async def check_cart_status(request):
+    """
+    Return the cart totals and the quantity of each product in the cart.
+    
+    main.js polls this on every page load, so it is async: under ASGI the
+    request does not hold a worker thread while it waits for the database.
+    """
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return JsonResponse(await _session_cart_status(request))
+    cart, created = await Cart.objects.aget_or_create(user=request.user)
+    cart_items = [item async for item in cart.items.values('product_id', 'quantity').aiterator()]
     return JsonResponse({
-        'total_items': cart.get_total_items(),
-        'total_price': cart.get_total_price(),
+        'total_items': cart.total_items,
+        'total_price': cart.total_price,
         'cart_items': cart_items
     })
 
-@login_required
+async def _session_cart_status(request):
+    """
+    Build the check_cart_status payload of an anonymous visitor's cookie cart.
+    """
+    lines = get_session_cart(request).lines
+    prices = {}
+    if lines:
+        products = Product.objects.filter(pk__in=list(lines)).values('id', 'price')
+        prices = {product['id']: product['price'] async for product in products.aiterator()}
+    cart_items = [
+        {'product_id': product_id, 'quantity': quantity}
+        for product_id, quantity in lines.items() if product_id in prices
+    ]
+    return {
+        'total_items': sum(item['quantity'] for item in cart_items),
+        'total_price': sum((prices[item['product_id']] * item['quantity'] for item in cart_items), Decimal('0.00')),
+        'cart_items': cart_items,
+    }
+
 def cart_detail(request):
     # Get or create cart for the user
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    return render(request, 'cart/cart_detail.html', {'cart': cart})
+    summary = get_cart_summary(request)
+    return render(request, 'cart/cart_detail.html', {'cart': summary.cart})
 
-@login_required
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
+    summary = get_cart_summary(request)
+    cart = summary.cart
+    # Units this cart can have: the unreserved stock plus its own hold
+    available = cart.get_available(product)
     
     # Check if product is available
-    if not product.is_available():
+    if available == 0:
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': False,
@@ -45,153 +80,265 @@ def add_to_cart(request, product_id):
     # Validate quantity
     if quantity <= 0:
         quantity = 1
-    if quantity > product.inventory:
-        quantity = product.inventory
+    if quantity > available:
+        quantity = available
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': True,
-                'message': f"Only {product.inventory} units of {product.name} available. Adjusted quantity.",
+                'message': f"Only {available} units of {product.name} available. Adjusted quantity.",
                 'quantity': quantity
             })
-        messages.warning(request, f"Only {product.inventory} units of {product.name} available. Adjusted quantity.")
-    
-    # Get or create cart
-    cart, created = Cart.objects.get_or_create(user=request.user)
+        messages.warning(request, f"Only {available} units of {product.name} available. Adjusted quantity.")
     
     # Try to get existing cart item or create new one
     try:
-        cart_item = CartItem.objects.get(cart=cart, product=product)
-        # Update quantity, ensuring it doesn't exceed inventory
+        cart_item = summary.get_item_for_product(product.id)
+        # Update quantity, ensuring it doesn't exceed what the cart can hold
         new_quantity = cart_item.quantity + quantity
-        if new_quantity > product.inventory:
-            new_quantity = product.inventory
+        if new_quantity > available:
+            new_quantity = available
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 return JsonResponse({
                     'success': True,
-                    'message': f"Cart adjusted to maximum available quantity ({product.inventory}).",
-                    'total_items': cart.get_total_items(),
-                    'total_price': cart.get_total_price(),
+                    'message': f"Cart adjusted to maximum available quantity ({available}).",
+                    'total_items': summary.total_items,
+                    'total_price': summary.total_price,
                     'product_name': product.name
                 })
-            messages.warning(request, f"Cart adjusted to maximum available quantity ({product.inventory}).")
-        cart_item.quantity = new_quantity
-        cart_item.save()
+            messages.warning(request, f"Cart adjusted to maximum available quantity ({available}).")
+        cart.set_item_quantity(cart_item, new_quantity)
+        summary = get_cart_summary(request, refresh=True)
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': True,
                 'message': f"Updated {product.name} quantity in your cart.",
-                'total_items': cart.get_total_items(),
-                'total_price': cart.get_total_price(),
+                'total_items': summary.total_items,
+                'total_price': summary.total_price,
                 'product_name': product.name
             })
         messages.success(request, f"Updated {product.name} quantity in your cart.")
     except CartItem.DoesNotExist:
-        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        if cart.max_lines is not None and len(cart.lines) >= cart.max_lines:
+            message = _cart_full_message(cart)
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({'success': False, 'message': message})
+            messages.error(request, message)
+            return redirect('cart_detail')
+        if cart.add_item(product, quantity) is None:
+            # Another cart took the last units in the meantime
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({
+                    'success': False,
+                    'message': f"{product.name} is out of stock."
+                })
+            messages.error(request, f"{product.name} is out of stock.")
+            return redirect('product_detail', pk=product_id)
+        summary = get_cart_summary(request, refresh=True)
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': True,
                 'message': f"Added {product.name} to your cart.",
-                'total_items': cart.get_total_items(),
-                'total_price': cart.get_total_price(),
+                'total_items': summary.total_items,
+                'total_price': summary.total_price,
                 'product_name': product.name
             })
         messages.success(request, f"Added {product.name} to your cart.")
     
     return redirect('cart_detail')
 
-@login_required
+def _cart_full_message(cart):
+    return f"Your cart can hold at most {cart.max_lines} different products. Remove one to add another."
+
 def update_cart(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    summary = get_cart_summary(request)
+    cart = summary.cart
+    cart_item = summary.get_item(item_id)
+    if cart_item is None:
+        raise Http404("No cart item matches the given query.")
     
     action = request.POST.get('action')
     if action == 'remove':
-        cart_item.delete()
+        cart.remove_item(cart_item)
         messages.success(request, f"Removed {cart_item.product.name} from your cart.")
     else:
         # Get new quantity
         try:
             quantity = int(request.POST.get('quantity', cart_item.quantity))
             if quantity <= 0:
-                cart_item.delete()
+                cart.remove_item(cart_item)
                 messages.success(request, f"Removed {cart_item.product.name} from your cart.")
             else:
-                # Check inventory
-                if quantity > cart_item.product.inventory:
-                    quantity = cart_item.product.inventory
-                    messages.warning(request, f"Only {cart_item.product.inventory} units available. Adjusted quantity.")
+                # Check the units this cart can hold
+                available = cart.get_available(cart_item.product)
+                if quantity > available:
+                    quantity = available
+                    messages.warning(request, f"Only {available} units available. Adjusted quantity.")
                 
-                cart_item.quantity = quantity
-                cart_item.save()
+                cart.set_item_quantity(cart_item, quantity)
                 messages.success(request, f"Updated {cart_item.product.name} quantity.")
         except ValueError:
             messages.error(request, "Invalid quantity.")
     
     # Handle AJAX requests
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        cart = Cart.objects.get(user=request.user)
+        summary = get_cart_summary(request, refresh=True)
         # Include item price if the item still exists
         item_price = None
-        try:
-            updated_item = CartItem.objects.get(id=item_id)
+        updated_item = summary.get_item(item_id)
+        if updated_item is not None:
             item_price = updated_item.get_cost()
-        except CartItem.DoesNotExist:
-            # Item was removed
-            pass
             
         return JsonResponse({
             'success': True,
-            'total_price': cart.get_total_price(),
-            'total_items': cart.get_total_items(),
+            'total_price': summary.total_price,
+            'total_items': summary.total_items,
             'item_price': item_price
         })
     
     return redirect('cart_detail')
 
-@login_required
+# Largest number of lines accepted by one batch request
+MAX_BATCH_OPERATIONS = 100
+
+def _parse_batch(request):
+    """
+    Parse the operations of a batch request into (product_id, quantity, mode) tuples.
+    
+    Raises ValueError with a user-facing message if the payload is malformed.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        raise ValueError("Request body must be JSON.")
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("'operations' must be a non-empty list.")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations are allowed per request.")
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError("Each operation must be an object.")
+        product_id = operation.get('product_id')
+        quantity = operation.get('quantity', 1)
+        mode = operation.get('mode', 'add')
+        if not isinstance(product_id, int) or not isinstance(quantity, int) or isinstance(quantity, bool):
+            raise ValueError("'product_id' and 'quantity' must be integers.")
+        if mode not in ('add', 'set'):
+            raise ValueError("'mode' must be 'add' or 'set'.")
+        if quantity < 0 or (mode == 'add' and quantity == 0):
+            raise ValueError("'quantity' must be positive ('set' also accepts 0 to remove).")
+        parsed.append((product_id, quantity, mode))
+    return parsed
+
+@require_POST
+def batch_update_cart(request):
+    """
+    Add or update many cart lines in one request.
+    
+    The body is {"operations": [{"product_id": 1, "quantity": 2, "mode": "add"}]}.
+    "add" increases the quantity, "set" replaces it (0 removes the line).
+    Quantities are clamped to the stock the cart can hold like add_to_cart
+    does. All changes are applied in one transaction with bulk queries.
+    """
+    try:
+        operations = _parse_batch(request)
+    except ValueError as error:
+        return JsonResponse({'success': False, 'message': str(error)}, status=400)
+    
+    cart = get_cart_summary(request).cart
+    product_ids = {product_id for product_id, quantity, mode in operations}
+    products = Product.objects.in_bulk(product_ids)
+    existing = cart.get_quantities(product_ids)
+    held = cart.get_held_quantities(product_ids)
+    
+    # Work out the final quantity of every touched line in memory first
+    quantities = dict(existing)
+    lines = len(cart.lines) if cart.max_lines is not None else 0
+    results = []
+    for product_id, quantity, mode in operations:
+        product = products.get(product_id)
+        if product is None:
+            results.append({'product_id': product_id, 'success': False, 'message': "Product not found."})
+            continue
+        current = quantities.get(product_id, 0)
+        new_quantity = current + quantity if mode == 'add' else quantity
+        if cart.max_lines is not None and not current and new_quantity > 0 and lines >= cart.max_lines:
+            results.append({'product_id': product_id, 'success': False, 'message': _cart_full_message(cart)})
+            continue
+        available = product.available + held.get(product_id, 0)
+        if new_quantity > 0 and available == 0:
+            results.append({'product_id': product_id, 'success': False, 'message': f"{product.name} is out of stock."})
+            continue
+        result = {'product_id': product_id, 'success': True}
+        if new_quantity > available:
+            new_quantity = available
+            result['message'] = f"Only {available} units of {product.name} available. Adjusted quantity."
+        lines += (new_quantity > 0) - (current > 0)
+        quantities[product_id] = new_quantity
+        result['quantity'] = new_quantity
+        results.append(result)
+    
+    changed = {
+        product_id: quantity for product_id, quantity in quantities.items()
+        if quantity != existing.get(product_id, 0)
+    }
+    if changed:
+        written = cart.set_quantities(changed)
+        for result in results:
+            # Another cart took some of the units in the meantime
+            if result.get('quantity', 0) > written.get(result['product_id'], result['quantity']):
+                result['quantity'] = written[result['product_id']]
+                result['message'] = "Fewer units were available than expected. Adjusted quantity."
+    
+    summary = get_cart_summary(request, refresh=True)
+    return JsonResponse({
+        'success': all(result['success'] for result in results),
+        'total_items': summary.total_items,
+        'total_price': summary.total_price,
+        'results': results,
+    })
+
 def clear_cart(request):
     if request.method == 'POST':
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart.clear()
-            messages.success(request, "Your cart has been cleared.")
-        except Cart.DoesNotExist:
-            pass
+        get_cart_summary(request).cart.clear()
+        messages.success(request, "Your cart has been cleared.")
     
     return redirect('cart_detail')
 
 @login_required
 def checkout(request):
-    cart = get_object_or_404(Cart, user=request.user)
+    summary = get_cart_summary(request)
+    cart = summary.cart
     
     # Check if cart is empty
-    if len(cart.get_cart_items()) == 0:
+    if len(summary) == 0:
         messages.warning(request, "Your cart is empty. Add some products before checkout.")
         return redirect('product_list')
     
     if request.method == 'POST':
-        # Process checkout
-        # Check inventory and availability before finalizing
-        inventory_error = False
-        for item in cart.get_cart_items():
-            if not item.product.is_available():
-                messages.error(request, f"{item.product.name} is no longer available.")
-                inventory_error = True
-            elif item.quantity > item.product.inventory:
-                messages.error(request, f"Sorry, only {item.product.inventory} units of {item.product.name} available.")
-                inventory_error = True
-        
-        if inventory_error:
+        # Process checkout: stock is checked and taken in one transaction
+        try:
+            place_order(cart)
+        except InsufficientStock as error:
+            for item, available in error.shortages:
+                if available == 0:
+                    messages.error(request, f"{item.product.name} is no longer available.")
+                else:
+                    messages.error(request, f"Sorry, only {available} units of {item.product.name} available.")
             return redirect('cart_detail')
         
-        # Update inventory using the update_stock method
-        for item in cart.get_cart_items():
-            product = item.product
-            product.update_stock(-item.quantity)
-        
-        # Clear cart after successful checkout
-        cart.clear()
-        
         messages.success(request, "Your order has been placed successfully!")
         return redirect('product_list')
     
-    return render(request, 'cart/checkout.html', {'cart': cart})
\ No newline at end of file
+    return render(request, 'cart/checkout.html', {'cart': cart})
+
+@login_required
+def order_history(request):
+    """
+    Display the user's past orders, newest first, one keyset page at a time.
+    """
+    orders = Order.objects.filter(user=request.user).prefetch_related('items')
+    paginator = KeysetPaginator(orders, ordering=('-created_at', '-id'), per_page=10)
+    page = paginator.get_page(request.GET.get('after'))
+    return render(request, 'cart/order_history.html', {'orders': page})
@@ -0,0 +1,245 @@
+"""
+Per-view performance instrumentation.
+
+InstrumentationMiddleware records, for every request, the number of SQL
+queries, the time spent in the database, the time spent rendering
+templates and the wall time, grouped by the resolved URL name. Recent
+samples are kept in a rolling window per view and summarised as
+p50/p95/p99 by the staff-only view_metrics endpoint.
+
+Views can be given query budgets through the VIEW_QUERY_BUDGETS setting
+({url_name: max_queries}). With QUERY_BUDGET_STRICT enabled (as tests
+should do) a request that exceeds its budget raises QueryBudgetExceeded;
+otherwise a warning is logged.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+# Measurements of the request being handled in the current thread or task
+_current = contextvars.ContextVar('view_metrics_sample', default=None)
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a view issues more queries than its budget allows.
+    """
+
+class Sample:
+    """
+    Measurements of a single request.
+    """
+    __slots__ = ('queries', 'db_ms', 'template_ms', 'wall_ms')
+    
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.wall_ms = 0.0
+
+class MetricsRegistry:
+    """
+    Rolling window of samples per URL name.
+    """
+    FIELDS = ('queries', 'db_ms', 'template_ms', 'wall_ms')
+    
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+    
+    def record(self, name, sample):
+        with self._lock:
+            self._samples[name].append(tuple(getattr(sample, field) for field in self.FIELDS))
+            self._counts[name] += 1
+    
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+    
+    def summary(self):
+        """
+        Return {url_name: {'requests': n, field: {'p50', 'p95', 'p99', 'max'}}}.
+        """
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+        result = {}
+        for name, samples in sorted(snapshot.items()):
+            stats = {'requests': counts[name], 'window': len(samples)}
+            for index, field in enumerate(self.FIELDS):
+                values = sorted(round(sample[index], 2) for sample in samples)
+                stats[field] = {
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'p99': percentile(values, 99),
+                    'max': values[-1],
+                }
+            result[name] = stats
+        return result
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+registry = MetricsRegistry(getattr(settings, 'VIEW_METRICS_WINDOW', 1000))
+
+def _record_query(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db_ms += (time.perf_counter() - start) * 1000
+
+def install_query_recorder(connection, **kwargs):
+    """
+    Add _record_query to the execute wrappers of a database connection.
+    
+    Connections are per thread and async views query from sync_to_async
+    threads, so the wrapper is installed on every connection as it is
+    created instead of around each request.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+connection_created.connect(install_query_recorder)
+for _connection in connections.all(initialized_only=True):
+    install_query_recorder(_connection)
+
+_original_render = Template.render
+
+def _timed_render(self, context=None, request=None):
+    sample = _current.get()
+    if sample is None:
+        return _original_render(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        sample.template_ms += (time.perf_counter() - start) * 1000
+
+# Instrumented requests in flight; the timed render is installed while there are any
+_render_lock = threading.Lock()
+_timed_requests = 0
+
+@contextmanager
+def timed_template_rendering():
+    """
+    Time every top-level template render (included templates are part of it) for the duration of the block.
+    
+    Django's Template.render is only replaced while an instrumented request
+    runs, so management commands and code outside requests render with
+    the original method.
+    """
+    global _timed_requests
+    with _render_lock:
+        if _timed_requests == 0:
+            Template.render = _timed_render
+        _timed_requests += 1
+    try:
+        yield
+    finally:
+        with _render_lock:
+            _timed_requests -= 1
+            if _timed_requests == 0:
+                Template.render = _original_render
+
+class InstrumentationMiddleware:
+    """
+    Record query count, DB time, template time and wall time per URL name.
+    
+    Place it first in MIDDLEWARE so the wall time covers the whole stack.
+    It supports both WSGI and ASGI, so async views are not forced back
+    onto a thread by this middleware.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self.measure(request):
+            response = self.get_response(request)
+        return response
+    
+    async def __acall__(self, request):
+        with self.measure(request):
+            response = await self.get_response(request)
+        return response
+    
+    @contextmanager
+    def measure(self, request):
+        sample = Sample()
+        # The context variable is copied into the threads of sync_to_async,
+        # so queries of async views are counted as well
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with timed_template_rendering():
+                yield sample
+        finally:
+            sample.wall_ms = (time.perf_counter() - start) * 1000
+            _current.reset(token)
+        
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match is not None and match.url_name else None
+        if name:
+            registry.record(name, sample)
+            check_query_budget(name, sample.queries)
+
+def check_query_budget(name, queries):
+    """
+    Enforce the VIEW_QUERY_BUDGETS entry of a view.
+    """
+    budget = getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(name)
+    if budget is None or queries <= budget:
+        return
+    message = f"View '{name}' ran {queries} queries, over its budget of {budget}."
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+def is_admin(user):
+    return user.is_staff
+
+@login_required
+@user_passes_test(is_admin)
+def view_metrics(request):
+    """
+    Return the rolling per-view metrics as JSON (staff only).
+    """
+    return JsonResponse({
+        'window': registry.window,
+        'budgets': getattr(settings, 'VIEW_QUERY_BUDGETS', {}),
+        'views': registry.summary(),
+    })
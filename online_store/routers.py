@@ -0,0 +1,149 @@
+"""
+Primary/replica database routing.
+
+When a 'replica' database is configured, ReplicaRoutingMiddleware marks
+safe (GET/HEAD) requests to the views in REPLICA_READ_VIEWS, and
+PrimaryReplicaRouter sends the reads of those requests to the replica.
+Every other read, and every write, goes to the primary. Sessions and
+users are always read from the primary, so a lagging replica can never
+log anyone out.
+
+Reads are kept consistent with the client's own writes: once a request
+writes, the rest of it reads from the primary, and the response sets a
+short-lived cookie that pins the client to the primary for
+REPLICA_STICKY_SECONDS, the replication lag we are prepared to tolerate.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import Resolver404, resolve
+
+REPLICA = 'replica'
+
+# Cookie that pins a client to the primary after it wrote
+STICKY_COOKIE_NAME = 'primary_reads'
+
+# Apps whose rows are always read from the primary
+PRIMARY_ONLY_APPS = {'sessions', 'auth'}
+
+# Statements that change data
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Routing state of the current request; the object is shared with the
+# threads of sync_to_async, so writes made there are seen here as well
+_current = ContextVar('db_routing', default=None)
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+class PrimaryReplicaRouter:
+    """
+    Send the reads of replica-eligible requests to the replica and everything else to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is not None and state.use_replica and not state.wrote \
+                and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return REPLICA
+        return 'default'
+    
+    def db_for_write(self, model, **hints):
+        return 'default'
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != REPLICA
+
+def _track_writes(execute, sql, params, many, context):
+    # db_for_write is also asked for the reads of get_or_create() and
+    # select_for_update(), so writes are recognized by their statements
+    state = _current.get()
+    if state is not None and not state.wrote and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        state.wrote = True
+    return execute(sql, params, many, context)
+
+def install_write_tracker(connection, **kwargs):
+    """
+    Record writes to the primary in the routing state of the current request.
+    """
+    if connection.alias == 'default' and _track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track_writes)
+
+connection_created.connect(install_write_tracker)
+for _connection in connections.all(initialized_only=True):
+    install_write_tracker(_connection)
+
+def is_replica_view(request):
+    """
+    Return whether the reads of a request may be served by the replica.
+    """
+    if request.method not in ('GET', 'HEAD') or STICKY_COOKIE_NAME in request.COOKIES:
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    name = f'{match.func.__module__}.{match.func.__name__}'
+    return any(name == view or name.startswith(view + '.') for view in settings.REPLICA_READ_VIEWS)
+
+class ReplicaRoutingMiddleware:
+    """
+    Route the reads of each request and pin clients that wrote to the primary.
+    
+    Place it right after InstrumentationMiddleware, before any middleware
+    that reads the database. Like that middleware it supports both WSGI
+    and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self.route(request) as state:
+            response = self.get_response(request)
+        return self.pin(request, response, state)
+    
+    async def __acall__(self, request):
+        with self.route(request) as state:
+            response = await self.get_response(request)
+        return self.pin(request, response, state)
+    
+    @contextmanager
+    def route(self, request):
+        state = RoutingState(replica_configured() and is_replica_view(request))
+        token = _current.set(state)
+        try:
+            yield state
+        finally:
+            _current.reset(token)
+    
+    def pin(self, request, response, state):
+        """
+        Set the sticky cookie on responses to requests that wrote to the primary.
+        """
+        if state.wrote and replica_configured():
+            response.set_cookie(
+                STICKY_COOKIE_NAME, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
@@ -24,14 +24,18 @@ INSTALLED_APPS = [
     'users',
     'products',
     'cart',
+    'tasks',
 ]
 
 MIDDLEWARE = [
+    'online_store.instrumentation.InstrumentationMiddleware',
+    'online_store.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
+    'cart.middleware.SessionCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,12 +62,156 @@ TEMPLATES = [
 WSGI_APPLICATION = 'online_store.wsgi.application'
 
 # Database
+# DATABASE_ENGINE is one of sqlite or postgres. Setting DATABASE_REPLICA_NAME
+# (or DATABASE_REPLICA_HOST) adds a read replica; see online_store.routers.
+DATABASE_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgres': 'django.db.backends.postgresql',
+}
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+# Seconds a connection is reused across requests (0 closes it after each request)
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+# Check reused connections before a request uses them
+DATABASE_CONN_HEALTH_CHECKS = os.environ.get('DATABASE_CONN_HEALTH_CHECKS', '1') == '1'
+
+def database(name, host):
+    return {
+        'ENGINE': DATABASE_ENGINES[DATABASE_ENGINE],
+        'NAME': name,
+        'USER': os.environ.get('DATABASE_USER', ''),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+        'HOST': host,
+        'PORT': os.environ.get('DATABASE_PORT', ''),
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DATABASE_CONN_HEALTH_CHECKS,
+    }
+
 DATABASES = {
+    'default': database(
+        os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'), os.environ.get('DATABASE_HOST', ''),
+    ),
+}
+if os.environ.get('DATABASE_REPLICA_NAME') or os.environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = database(
+        os.environ.get('DATABASE_REPLICA_NAME', DATABASES['default']['NAME']),
+        os.environ.get('DATABASE_REPLICA_HOST', DATABASES['default']['HOST']),
+    )
+    # Tests run against the primary only
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['online_store.routers.PrimaryReplicaRouter']
+# Views (or whole view modules) whose GET requests read from the replica
+REPLICA_READ_VIEWS = ['products.views', 'cart.views.check_cart_status']
+# Seconds a client reads from the primary after it wrote, covering replication lag
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Caches
+# Cache backends the catalog and session caches below can use
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+# The product catalog uses its own cache alias so its backend can be chosen
+# independently: CATALOG_CACHE_BACKEND is one of locmem, file or redis.
+CATALOG_CACHE_LOCATIONS = {
+    'locmem': 'catalog',
+    'file': os.path.join(BASE_DIR, 'cache', 'catalog'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+CATALOG_CACHE_BACKEND = os.environ.get('CATALOG_CACHE_BACKEND', 'locmem')
+# Cache of the cached session profiles below (locmem, file or redis); with
+# several server processes it has to be shared, i.e. redis
+SESSION_CACHE_BACKEND = os.environ.get('SESSION_CACHE_BACKEND', 'locmem')
+SESSION_CACHE_LOCATIONS = {
+    'locmem': 'sessions',
+    'file': os.path.join(BASE_DIR, 'cache', 'sessions'),
+    'redis': 'redis://127.0.0.1:6379/2',
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': CACHE_BACKENDS[CATALOG_CACHE_BACKEND],
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', CATALOG_CACHE_LOCATIONS[CATALOG_CACHE_BACKEND]),
+    },
+    'sessions': {
+        'BACKEND': CACHE_BACKENDS[SESSION_CACHE_BACKEND],
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', SESSION_CACHE_LOCATIONS[SESSION_CACHE_BACKEND]),
+    },
+}
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+# Seconds over which catalog changes are batched into one refresh of the
+# category facets; also how long the facets are cached
+FACETS_REFRESH_INTERVAL = int(os.environ.get('FACETS_REFRESH_INTERVAL', 10))
+# Seconds between checks for a newer snapshot of the product recommendations
+# (built by build_recommendations)
+RECOMMENDATIONS_RELOAD_INTERVAL = int(os.environ.get('RECOMMENDATIONS_RELOAD_INTERVAL', 300))
+
+# Sessions and authentication
+# SESSION_PROFILE chooses how each request loads its session and user:
+#   db      sessions and users are read from the database on every request
+#   cached  cached_db sessions and cached users: reads hit the 'sessions'
+#           cache, session writes go through to the database
+#   cookie  signed-cookie sessions (no session table; the data is signed,
+#           not encrypted) and cached users
+# Switching to cookie signs everyone out once.
+SESSION_PROFILES = {
+    'db': ('django.contrib.sessions.backends.db', False),
+    'cached': ('django.contrib.sessions.backends.cached_db', True),
+    'cookie': ('django.contrib.sessions.backends.signed_cookies', True),
+}
+SESSION_PROFILE = os.environ.get('SESSION_PROFILE', 'db')
+SESSION_ENGINE, AUTH_USER_CACHE = SESSION_PROFILES[SESSION_PROFILE]
+SESSION_CACHE_ALIAS = 'sessions'
+# Seconds a logged-in user stays cached; saving the user drops it sooner
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 300))
+
+# Seconds a cart holds the units put in it; release_expired_reservations
+# gives expired holds back to the stock
+CART_RESERVATION_TTL = int(os.environ.get('CART_RESERVATION_TTL', 15 * 60))
+
+# Background tasks (see tasks.queue)
+# Run tasks in the web process right after commit instead of queuing them
+TASKS_EAGER = os.environ.get('TASKS_EAGER', '') == '1'
+# Seconds before the first retry of a failed task; doubled on every further failure
+TASKS_RETRY_DELAY = 30
+TASKS_MAX_RETRY_DELAY = 60 * 60
+# Seconds after which a task claimed by a worker that died is run again
+TASKS_LOCK_TIMEOUT = 10 * 60
+# Tasks queued with {'order_id': ...} whenever an order is placed
+ORDER_PLACED_TASKS = ['cart.tasks.send_order_confirmation']
+
+# Email
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'orders@online-store.local')
+
+# Per-view instrumentation
+# Number of recent requests per view kept for the p50/p95/p99 metrics
+VIEW_METRICS_WINDOW = 1000
+# Maximum number of SQL queries per view, holding on a cold cache: they
+# include the session and auth lookups, the cart a user's first request
+# creates and the periodic reload of the recommendations (see the
+# QueryBudgetTests of each app)
+VIEW_QUERY_BUDGETS = {
+    'product_list': 8,
+    'product_feed': 7,
+    'product_detail': 10,
+    'product_detail_json': 3,
+    'catalog_feed': 3,
+    'product_search': 9,
+    'cart_detail': 7,
+    'check_cart_status': 7,
+    'add_to_cart': 17,
+    'update_cart': 15,
+    'batch_update_cart': 19,
+    'checkout': 21,
+    'order_history': 7,
 }
+# Raise QueryBudgetExceeded instead of logging a warning (enable in tests and CI)
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '') == '1'
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -90,6 +238,21 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# With STATIC_BUILD=1, collectstatic minifies, content-hashes and pre-compresses
+# the assets and {% static %} links to the hashed names (run collectstatic first)
+STATIC_BUILD = os.environ.get('STATIC_BUILD', '') == '1'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'online_store.staticfiles.CompressedManifestStaticFilesStorage' if STATIC_BUILD
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
 
 # Media files
 MEDIA_URL = '/media/'
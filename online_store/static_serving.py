@@ -0,0 +1,132 @@
+"""
+WSGI layer that serves static and media files ahead of Django.
+
+Requests under STATIC_URL are answered from STATIC_ROOT and requests
+under MEDIA_URL from MEDIA_ROOT without entering the Django stack. The
+pre-compressed .br/.gz variants written by the static build are chosen
+according to Accept-Encoding. Content-hashed files from the manifest are
+sent with a one-year immutable Cache-Control, and everything else carries
+a short max-age plus Last-Modified/ETag for cheap revalidation.
+"""
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+# Cache lifetime of content-hashed files, which never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Cache lifetime of files whose content can change under the same name
+DEFAULT_MAX_AGE = 300
+
+# Encodings in order of preference, with the suffix of their variant
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def accepted_encodings(header):
+    """
+    Return the content codings accepted by an Accept-Encoding header.
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+class StaticFilesApplication:
+    """
+    Wrap a WSGI application and serve static and media files in front of it.
+    """
+    def __init__(self, application):
+        self.application = application
+        self.mounts = [
+            (prefix, root, is_static)
+            for prefix, root, is_static in (
+                (settings.STATIC_URL, settings.STATIC_ROOT, True),
+                (settings.MEDIA_URL, settings.MEDIA_ROOT, False),
+            )
+            if prefix and root and prefix.startswith('/')
+        ]
+        # Names written by the manifest storage contain a hash of their content
+        self.immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            # PEP 3333 passes the path as latin-1 decoded bytes
+            path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8', 'replace')
+            for prefix, root, is_static in self.mounts:
+                if path.startswith(prefix):
+                    return self.serve(environ, start_response, root, path[len(prefix):], is_static)
+        return self.application(environ, start_response)
+
+    def serve(self, environ, start_response, root, name, is_static):
+        try:
+            full_path = safe_join(root, name)
+        except SuspiciousFileOperation:
+            full_path = None
+        if not name or full_path is None or not os.path.isfile(full_path):
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'Not Found']
+
+        stat = os.stat(full_path)
+        content_type, original_encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        headers = [('Content-Type', content_type)]
+
+        encoding, served_path = None, full_path
+        if original_encoding is None:
+            accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            has_variants = False
+            for coding, suffix in ENCODINGS:
+                if os.path.isfile(full_path + suffix):
+                    has_variants = True
+                    if encoding is None and coding in accepted:
+                        encoding, served_path = coding, full_path + suffix
+            if has_variants:
+                headers.append(('Vary', 'Accept-Encoding'))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+
+        if is_static and name in self.immutable:
+            headers.append(('Cache-Control', f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'))
+        else:
+            headers.append(('Cache-Control', f'public, max-age={DEFAULT_MAX_AGE}'))
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        headers.append(('ETag', etag))
+        headers.append(('Last-Modified', formatdate(stat.st_mtime, usegmt=True)))
+
+        if self.not_modified(environ, etag, stat.st_mtime):
+            start_response('304 Not Modified', headers)
+            return []
+
+        size = os.path.getsize(served_path)
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(served_path, 'rb'), 64 * 1024)
+
+    @staticmethod
+    def not_modified(environ, etag, mtime):
+        """
+        Evaluate If-None-Match and If-Modified-Since against the file.
+        """
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
@@ -0,0 +1,123 @@
+"""
+Static asset build.
+
+CompressedManifestStaticFilesStorage is used by collectstatic when
+STATIC_BUILD is enabled. It minifies CSS, strips indentation and comment
+lines from JavaScript, content-hashes every file through Django's
+manifest storage (so templates using {% static %} link to names like
+styles.3f2a1b9c8d7e.css) and writes .gz and .br variants next to each
+file. The .br variants need the brotli package from requirements.txt;
+without it the build warns and only writes .gz. The WSGI layer in
+online_store.static_serving sends those variants.
+"""
+import gzip
+import logging
+import os
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Extensions worth compressing (images and fonts are compressed already)
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.txt', '.html', '.xml', '.map', '.ico'}
+
+# Variants smaller than this fraction of the original are not worth keeping
+MIN_COMPRESSION_RATIO = 0.95
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+
+def minify_css(source):
+    """
+    Strip comments and redundant whitespace from a stylesheet.
+    """
+    source = _CSS_COMMENT_RE.sub('', source)
+    source = _CSS_SPACE_RE.sub(' ', source)
+    source = _CSS_PUNCTUATION_RE.sub(r'\1', source)
+    source = source.replace(': ', ':').replace(';}', '}')
+    return source.strip()
+
+def strip_js_lines(source):
+    """
+    Strip indentation, blank lines and whole-line comments from a script.
+
+    Line breaks are kept so that automatic semicolon insertion and string
+    contents are never affected.
+    """
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': strip_js_lines}
+
+def compress(data):
+    """
+    Return {encoding suffix: compressed bytes} for the variants worth keeping.
+    """
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {
+        suffix: content for suffix, content in variants.items()
+        if len(content) < len(data) * MIN_COMPRESSION_RATIO
+    }
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that minifies CSS/JS before hashing and pre-compresses every file.
+    """
+    def url(self, name, force=False):
+        # STATIC_BUILD is an explicit opt-in, so link to the hashed names
+        # even when DEBUG would otherwise fall back to the originals
+        return super().url(name, force=True)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning("The brotli package is not installed, so no .br variants are written.")
+        paths = dict(paths)
+        for name in paths:
+            if self.minify(name):
+                # Hash the minified copy in STATIC_ROOT instead of the source file
+                paths[name] = (self, name)
+
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+
+        for name in set(paths) | set(self.hashed_files.values()):
+            self.write_compressed(name)
+
+    def minify(self, name):
+        """
+        Minify a collected file in place; return whether it was changed.
+        """
+        base, extension = os.path.splitext(name)
+        minifier = MINIFIERS.get(extension)
+        if minifier is None or base.endswith('.min'):
+            return False
+        with self.open(name) as original:
+            source = original.read().decode('utf-8')
+        self.delete(name)
+        self._save(name, ContentFile(minifier(source).encode('utf-8')))
+        return True
+
+    def write_compressed(self, name):
+        """
+        Write the .gz/.br variants of a collected file.
+        """
+        if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        for suffix, content in compress(data).items():
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(content))
@@ -3,9 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic.base import RedirectView
+from . import instrumentation
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/views/', instrumentation.view_metrics, name='view_metrics'),
     path('users/', include('users.urls')),
     path('cart/', include('cart.urls')),
     path('', include('products.urls')),
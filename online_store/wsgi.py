@@ -4,4 +4,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'online_store.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Serve static and media files without entering the Django stack
+from .static_serving import StaticFilesApplication  # noqa: E402
+
+application = StaticFilesApplication(application)
\ No newline at end of file
@@ -1,18 +1,85 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
 from django.utils.html import format_html
-from .models import Product
+from .bulk import delete_products, set_category, update_prices_and_stock
+from .models import CategoryFacet, Product
+from .search import search_queryset
+
+class ProductActionForm(ActionForm):
+    """
+    Action bar of the product changelist, with the target of "Move to category".
+    """
+    category = forms.ChoiceField(choices=[('', '---------')] + Product.CATEGORY_CHOICES, required=False)
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """
     Admin configuration for the Product model.
+    
+    Like the staff product list, the changelist edits prices and stock
+    with one bulk_update and deletes or moves the selected products with
+    single queries (see products.bulk).
     """
-    list_display = ('name', 'price', 'category', 'inventory', 'image_preview')
+    list_display = ('name', 'sku', 'price', 'category', 'inventory', 'reserved', 'image_preview')
+    list_editable = ('price', 'inventory')
+    list_per_page = 50
+    action_form = ProductActionForm
+    actions = ['move_to_category']
     list_filter = ('category',)
     search_fields = ('name', 'description')
     ordering = ('name',)
-    readonly_fields = ('image_preview_large',)
-    fields = ('name', 'description', 'price', 'category', 'inventory', 'image', 'image_preview_large')
+    readonly_fields = ('reserved', 'image_preview_large')
+    fields = ('sku', 'name', 'description', 'price', 'category', 'inventory', 'reserved', 'image', 'image_preview_large')
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            # The list never shows the descriptions
+            queryset = queryset.defer('description')
+        return queryset
+    
+    def changelist_view(self, request, extra_context=None):
+        # Rows edited in the list are collected by save_model and written with one bulk_update
+        request._edited_products = []
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            update_prices_and_stock(request._edited_products)
+        return response
+    
+    def save_model(self, request, obj, form, change):
+        edited = getattr(request, '_edited_products', None)
+        if edited is None:
+            super().save_model(request, obj, form, change)
+        else:
+            edited.append({'id': obj.pk, 'price': obj.price, 'inventory': obj.inventory})
+    
+    def delete_queryset(self, request, queryset):
+        delete_products(queryset)
+    
+    @admin.action(description="Move selected products to the chosen category")
+    def move_to_category(self, request, queryset):
+        category = request.POST.get('category')
+        if category not in dict(Product.CATEGORY_CHOICES):
+            self.message_user(request, "Choose the category to move the products to.", messages.ERROR)
+            return
+        count = set_category(queryset, category)
+        self.message_user(request, f"Moved {count} product(s) to {category}.", messages.SUCCESS)
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of icontains scans when it is available"""
+        matches = search_queryset(queryset, search_term) if search_term else None
+        if matches is None:
+            return super().get_search_results(request, queryset, search_term)
+        request._search_ranked = True
+        return matches, False
+    
+    def get_ordering(self, request):
+        """Show full-text matches best first unless a column is sorted"""
+        if getattr(request, '_search_ranked', False):
+            return ['search_rank']
+        return super().get_ordering(request)
     
     def image_preview(self, obj):
         """Display a small thumbnail in the admin list view"""
@@ -26,4 +93,18 @@ class ProductAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html('<img src="{}" width="300" height="300" style="object-fit: contain;" />', obj.image.url)
         return "-"
-    image_preview_large.short_description = 'Image Preview'
\ No newline at end of file
+    image_preview_large.short_description = 'Image Preview'
+
+@admin.register(CategoryFacet)
+class CategoryFacetAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the precomputed category facets.
+    """
+    list_display = ('category', 'product_count', 'in_stock_count', 'min_price', 'max_price', 'updated_at')
+    ordering = ('category',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
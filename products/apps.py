@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class ProductsConfig(AppConfig):
+    name = 'products'
+
+    def ready(self):
+        # Register signal handlers
+        from django.db.models.signals import post_migrate
+        from . import facets, signals
+        post_migrate.connect(signals.create_search_index, sender=self)
+        post_migrate.connect(facets.seed_facets, sender=self)
@@ -0,0 +1,86 @@
+"""
+Bulk changes to the catalog from the staff product list and the admin.
+
+Each operation writes all the selected products with a single statement
+(bulk_update, update or delete) and announces them with one
+catalog_changed, so the cache, search index, facets and repriced carts
+are brought up to date once per operation instead of once per product.
+"""
+from django.db import transaction
+from django.utils import timezone
+from cart.utils import remove_products_from_totals
+from .models import Product
+from .signals import catalog_changed
+
+def update_prices_and_stock(rows):
+    """
+    Write the price and inventory of several products with one bulk_update.
+    
+    rows are dicts with id, price and inventory. Rows that also carry
+    original_price and original_inventory (the values the editor was shown)
+    are skipped when the product changed since, e.g. because an order
+    consumed stock, so a stale list never overwrites newer values; rows
+    left at their original values are not even read.
+    Returns (updated products, products that changed since they were shown).
+    """
+    rows = {
+        row['id']: row for row in rows
+        if 'original_price' not in row
+        or (row['price'], row['inventory']) != (row['original_price'], row['original_inventory'])
+    }
+    if not rows:
+        return [], []
+    with transaction.atomic():
+        products = Product.objects.select_for_update().only('id', 'name', 'price', 'inventory').in_bulk(list(rows))
+        now = timezone.now()
+        updated, conflicts, repriced = [], [], []
+        for pk, product in products.items():
+            row = rows[pk]
+            if 'original_price' in row and (
+                product.price != row['original_price'] or product.inventory != row['original_inventory']
+            ):
+                conflicts.append(product)
+                continue
+            if product.price == row['price'] and product.inventory == row['inventory']:
+                continue
+            if product.price != row['price']:
+                repriced.append(pk)
+            product.price = row['price']
+            product.inventory = row['inventory']
+            product.updated_at = now
+            updated.append(product)
+        if updated:
+            Product.objects.bulk_update(updated, ['price', 'inventory', 'updated_at'])
+            catalog_changed.send(
+                sender=Product, product_ids=[product.pk for product in updated], repriced_ids=repriced,
+                reindex_ids=[],
+            )
+    return updated, conflicts
+
+def set_category(queryset, category):
+    """
+    Move the products of a queryset to another category; returns the number moved.
+    """
+    with transaction.atomic():
+        ids = list(queryset.exclude(category=category).values_list('pk', flat=True))
+        count = Product.objects.filter(pk__in=ids).update(category=category, updated_at=timezone.now())
+        if count:
+            catalog_changed.send(sender=Product, product_ids=ids)
+    return count
+
+def delete_products(queryset):
+    """
+    Delete the products of a queryset; returns the number deleted.
+    
+    Their cart items and holds are deleted with them, the stored totals of
+    those carts are reduced accordingly and order items keep their
+    snapshots, as for a single delete.
+    """
+    with transaction.atomic():
+        ids = list(queryset.values_list('pk', flat=True))
+        if not ids:
+            return 0
+        remove_products_from_totals(ids)
+        deleted, by_model = Product.objects.filter(pk__in=ids).delete()
+        catalog_changed.send(sender=Product, product_ids=ids)
+    return by_model.get(Product._meta.label, 0)
@@ -0,0 +1,173 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.text import slugify
+from online_store.routers import replica_configured
+from .filters import DEFAULT_FILTERS, filter_products
+from .models import Product
+from .pagination import KeysetPaginator
+
+VERSION_KEY = 'catalog:version'
+# Product columns that change with every hold and checkout. They are cached
+# per product apart from the lists and details (see apply_stock), so stock
+# changes invalidate single entries instead of the whole catalog.
+STOCK_FIELDS = ('inventory', 'reserved', 'updated_at')
+# Present for REPLICA_STICKY_SECONDS after an invalidation, while a lagging
+# replica may still serve the old rows
+INVALIDATED_KEY = 'catalog:invalidated'
+
+def get_catalog_cache():
+    """
+    Return the cache backend configured for the product catalog.
+    """
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+def get_catalog_version():
+    """
+    Return the current catalog version, which is part of every catalog cache key.
+    """
+    cache = get_catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from a timestamp so a lost version never points at old entries
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+def invalidate_catalog():
+    """
+    Bump the catalog version so every cached list and detail entry goes stale.
+    """
+    cache = get_catalog_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+    if replica_configured():
+        cache.set(INVALIDATED_KEY, True, settings.REPLICA_STICKY_SECONDS)
+
+def catalog_key(*parts):
+    """
+    Build a cache key for the current catalog version.
+    """
+    return ':'.join(['catalog', str(get_catalog_version())] + [str(part) for part in parts])
+
+def fill_timeout():
+    """
+    Return how long an entry filled now may be cached.
+    
+    Entries filled right after an invalidation may hold rows a lagging
+    replica had not caught up on, so they only live as long as the
+    replication lag we tolerate (REPLICA_STICKY_SECONDS).
+    """
+    timeout = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+    if replica_configured() and get_catalog_cache().get(INVALIDATED_KEY):
+        return min(timeout, settings.REPLICA_STICKY_SECONDS)
+    return timeout
+
+def get_cached(key, compute, products=None):
+    """
+    Return the cached value for key, computing and storing it on a miss.
+    
+    products(value) lists the products in the value, whose stock is then
+    brought up to date with apply_stock().
+    """
+    cache = get_catalog_cache()
+    value = cache.get(key)
+    fresh = value is None
+    if fresh:
+        value = compute()
+        cache.set(key, value, fill_timeout())
+    if products is not None:
+        apply_stock(products(value), fresh)
+    return value
+
+def apply_stock(products, fresh=False):
+    """
+    Set the current stock (STOCK_FIELDS) on products that came from the cache.
+    
+    The stock of every product is looked up with one get_many and the
+    misses are read with a single query. Products just read from the
+    database (fresh) have current stock and are only remembered.
+    """
+    products = [product for product in products if product]
+    if not products:
+        return
+    cache = get_catalog_cache()
+    prefix = catalog_key('stock')
+    keys = {f'{prefix}:{product.pk}': product for product in products}
+    if fresh:
+        cache.set_many(
+            {key: tuple(getattr(product, field) for field in STOCK_FIELDS) for key, product in keys.items()},
+            fill_timeout(),
+        )
+        return
+    found = cache.get_many(list(keys))
+    missing = [product.pk for key, product in keys.items() if key not in found]
+    if missing:
+        rows = Product.objects.filter(pk__in=missing).values_list('pk', *STOCK_FIELDS)
+        loaded = {f'{prefix}:{pk}': tuple(values) for pk, *values in rows}
+        cache.set_many(loaded, fill_timeout())
+        found.update(loaded)
+    for key, product in keys.items():
+        if key in found:
+            for field, value in zip(STOCK_FIELDS, found[key]):
+                setattr(product, field, value)
+
+def invalidate_stock(product_ids):
+    """
+    Drop the cached stock of the given products, leaving the rest of the catalog cache warm.
+    """
+    prefix = catalog_key('stock')
+    get_catalog_cache().delete_many([f'{prefix}:{pk}' for pk in product_ids])
+
+def _digest(cursor):
+    # Cursors embed product names, so hash them to keep keys short
+    return hashlib.md5(cursor.encode()).hexdigest() if cursor else 'first'
+
+def get_product_page(filters=None, cursor=None, per_page=24):
+    """
+    Return a KeysetPage of the products matching the filters (see products.filters) from the cache.
+    """
+    filters = {**DEFAULT_FILTERS, **(filters or {})}
+    
+    def compute():
+        products, ordering = filter_products(Product.objects.all(), filters)
+        return KeysetPaginator(products, ordering=ordering, per_page=per_page).get_page(cursor)
+    key = catalog_key(
+        'list', slugify(filters['category']) or 'all', filters['min_price'], filters['max_price'],
+        int(filters['in_stock']), filters['sort'], per_page, _digest(cursor),
+    )
+    return get_cached(key, compute, lambda page: page.object_list)
+
+def get_product(pk):
+    """
+    Return a single product from the cache, or None if it does not exist.
+    """
+    # Missing products are cached as False so repeated misses stay cheap
+    product = get_cached(
+        catalog_key('detail', pk), lambda: Product.objects.filter(pk=pk).first() or False, lambda product: [product],
+    )
+    return product or None
+
+def get_products(pks):
+    """
+    Return the existing products among pks, in that order, from the cache.
+    
+    All of them are looked up with one get_many, and the misses are read
+    with a single query and cached for get_product() as well.
+    """
+    cache = get_catalog_cache()
+    prefix = catalog_key('detail')
+    keys = {f'{prefix}:{pk}': pk for pk in pks}
+    found = cache.get_many(list(keys))
+    apply_stock(found.values())
+    missing = [pk for key, pk in keys.items() if key not in found]
+    if missing:
+        products = Product.objects.in_bulk(missing)
+        loaded = {f'{prefix}:{pk}': products.get(pk) or False for pk in missing}
+        cache.set_many(loaded, fill_timeout())
+        apply_stock(loaded.values(), fresh=True)
+        found.update(loaded)
+    return [found[key] for key in keys if found.get(key)]
@@ -0,0 +1,237 @@
+"""
+Bulk import and export of the product catalog.
+
+Imports read CSV or JSONL files row by row and upsert them in chunks
+keyed by SKU, so files of any size load in constant memory with a
+handful of queries per chunk. Exports stream the catalog in the same
+format, so an export can be edited and imported again.
+"""
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .models import Product
+from .renditions import delete_unused_renditions
+from .signals import catalog_changed
+
+# Columns of the import and export files, in export order
+FIELDS = ['sku', 'name', 'description', 'price', 'category', 'inventory', 'image']
+
+# Fields overwritten when an imported SKU already exists
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'inventory', 'updated_at']
+
+# Rows upserted per transaction
+DEFAULT_CHUNK_SIZE = 1000
+
+# Rows buffered per chunk of a streamed export
+EXPORT_CHUNK_SIZE = 1000
+
+CATEGORIES = {value for value, label in Product.CATEGORY_CHOICES}
+
+class RowError(ValueError):
+    """
+    Raised for an import row that cannot be loaded.
+    """
+
+def read_rows(path, file_format=None):
+    """
+    Yield (line_number, row) pairs from a CSV or JSONL file, one at a time.
+
+    The format is taken from the extension unless given. Rows of a JSONL
+    file that are not valid JSON objects are yielded as None.
+    """
+    if file_format is None:
+        file_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if file_format == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+def parse_row(row):
+    """
+    Validate an import row and return its cleaned values.
+    """
+    if row is None:
+        raise RowError("Not a JSON object.")
+
+    def text(name, max_length=None, required=True):
+        value = row.get(name)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise RowError(f"'{name}' is required.")
+        if max_length and len(value) > max_length:
+            raise RowError(f"'{name}' is longer than {max_length} characters.")
+        return value
+
+    try:
+        price = Decimal(text('price')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f"Invalid price {row.get('price')!r}.")
+    if price < 0 or price >= Decimal('1e8'):
+        raise RowError(f"Price {price} is out of range.")
+    inventory = text('inventory', required=False) or '0'
+    if not inventory.isdigit():
+        raise RowError(f"Invalid inventory {row.get('inventory')!r}.")
+    category = text('category')
+    if category not in CATEGORIES:
+        raise RowError(f"Unknown category {category!r}.")
+    return {
+        'sku': text('sku', max_length=64),
+        'name': text('name', max_length=200),
+        'description': text('description', required=False),
+        'price': price,
+        'category': category,
+        'inventory': int(inventory),
+        'image': text('image', required=False),
+    }
+
+class ProductImporter:
+    """
+    Upsert parsed rows into the catalog in chunks.
+
+    Each chunk is written in one transaction: one query reads the existing
+    rows, bulk_create(update_conflicts=True) upserts the products and one
+    more query reads back their ids. catalog_changed is sent per chunk so
+    the cache, the search index and the carts holding repriced products
+    are updated too.
+    """
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, image_root=None, storage=default_storage):
+        self.chunk_size = chunk_size
+        self.image_root = image_root
+        self.storage = storage
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+        self.errors = []
+
+    def run(self, rows):
+        """
+        Import (line_number, row) pairs; invalid rows are recorded in errors and skipped.
+        """
+        chunk = {}
+        for line_number, row in rows:
+            try:
+                data = parse_row(row)
+            except RowError as error:
+                self.errors.append((line_number, str(error)))
+                continue
+            data['line'] = line_number
+            # A SKU repeated in the file is loaded with its last row
+            chunk[data['sku']] = data
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = {}
+        if chunk:
+            self.flush(chunk)
+        return self
+
+    def flush(self, chunk):
+        existing = {
+            sku: (image, price)
+            for sku, image, price in Product.objects.filter(sku__in=list(chunk)).values_list('sku', 'image', 'price')
+        }
+        plain, with_image = [], []
+        for sku, data in list(chunk.items()):
+            product = Product(**{field: data[field] for field in FIELDS if field != 'image'})
+            if data['image']:
+                try:
+                    product.image = self.store_image(data['image'], product)
+                except RowError as error:
+                    self.errors.append((data['line'], str(error)))
+                    del chunk[sku]
+                    continue
+                if product.image.name != existing.get(sku, (None, None))[0]:
+                    product.has_renditions = False
+                    with_image.append(product)
+                    continue
+            plain.append(product)
+        if not chunk:
+            return
+
+        with transaction.atomic():
+            if plain:
+                Product.objects.bulk_create(
+                    plain, update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS,
+                )
+            if with_image:
+                Product.objects.bulk_create(
+                    with_image, update_conflicts=True, unique_fields=['sku'],
+                    update_fields=UPDATE_FIELDS + ['image', 'has_renditions'],
+                )
+            ids = dict(Product.objects.filter(sku__in=list(chunk)).values_list('sku', 'id'))
+            repriced = [
+                ids[sku] for sku, (image, price) in existing.items()
+                if sku in chunk and price != chunk[sku]['price']
+            ]
+            catalog_changed.send(sender=Product, product_ids=list(ids.values()), repriced_ids=repriced)
+            # Products given another image drop the renditions of the old one
+            replaced = [existing[product.sku][0] for product in with_image if product.sku in existing]
+            transaction.on_commit(lambda: delete_unused_renditions(replaced, self.storage))
+        updated = sum(1 for sku in chunk if sku in existing)
+        self.created += len(chunk) - updated
+        self.updated += updated
+        self.images += len(with_image)
+
+    def store_image(self, value, product):
+        """
+        Copy a local image file into media storage and return its storage name.
+
+        Paths are resolved against image_root. A value that is not a local
+        file but already names a stored image (as in an export) is kept.
+        Files already stored under the target name with the same size are
+        not copied again, so nightly imports do not duplicate images.
+        """
+        path = value
+        if self.image_root and not os.path.isabs(path):
+            path = os.path.join(self.image_root, path)
+        if not os.path.isfile(path):
+            if self.storage.exists(value):
+                return value
+            raise RowError(f"Image {value!r} not found.")
+        name = Product._meta.get_field('image').generate_filename(product, os.path.basename(path))
+        if self.storage.exists(name) and self.storage.size(name) == os.path.getsize(path):
+            return name
+        with open(path, 'rb') as image_file:
+            return self.storage.save(name, File(image_file))
+
+class _Echo:
+    """
+    File-like object whose write() returns the value, for streaming csv.writer output.
+    """
+    def write(self, value):
+        return value
+
+def export_rows(file_format='csv'):
+    """
+    Yield the whole catalog as CSV or JSONL text, a chunk of rows at a time.
+    """
+    rows = Product.objects.order_by('id').values_list(*FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    buffer = []
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        format_row = writer.writerow
+    else:
+        def format_row(row):
+            return json.dumps(dict(zip(FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+    for row in rows:
+        buffer.append(format_row(['' if value is None else value for value in row]))
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
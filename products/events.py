@@ -0,0 +1,93 @@
+"""
+In-process publish/subscribe of price and stock changes.
+
+The Server-Sent Events streams of products.views.product_events subscribe
+to the broker for the products shown on a page. Changes are published
+after they are committed, from whichever thread saved them, and handed to
+the event loop of each stream with call_soon_threadsafe. The changed
+products are only read back when this process has subscribers.
+
+The broker lives in one process: with several server processes, a page
+only hears about changes made by the process serving its stream.
+"""
+import asyncio
+import threading
+
+from django.db import transaction
+from .models import Product
+
+# Event batches buffered per subscriber; a slow client loses the oldest
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Subscription:
+    """
+    A stream's interest in a set of products (None for all of them) and its queue of events.
+    """
+    def __init__(self, product_ids=None):
+        self.product_ids = product_ids
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+    
+    def wants(self, product_id):
+        return self.product_ids is None or product_id in self.product_ids
+    
+    def deliver(self, events):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(events)
+
+class Broker:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+    
+    def subscribe(self, product_ids=None):
+        subscription = Subscription(product_ids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+    
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+    
+    def publish(self, events):
+        """
+        Hand each subscriber the events about the products it is interested in.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            matching = [event for event in events if subscription.wants(event['id'])]
+            if not matching:
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, matching)
+            except RuntimeError:
+                # The loop of an abandoned stream was closed
+                self.unsubscribe(subscription)
+
+broker = Broker()
+
+def publish_product_changes(product_ids):
+    """
+    Publish the current price and stock of the given products once the change is committed.
+    """
+    if not product_ids or not broker.has_subscribers():
+        return
+    ids = list(product_ids)
+    
+    def publish():
+        rows = Product.objects.filter(pk__in=ids).values_list('id', 'price', 'inventory', 'reserved')
+        events = {
+            pk: {'id': pk, 'price': str(price), 'available': max(inventory - reserved, 0)}
+            for pk, price, inventory, reserved in rows
+        }
+        # Deleted products are announced as out of stock
+        broker.publish([events.get(pk, {'id': pk, 'price': None, 'available': 0}) for pk in ids])
+    
+    transaction.on_commit(publish)
@@ -0,0 +1,104 @@
+"""
+Precomputed category facets shown next to the catalog filters.
+
+The facets (product count, in-stock count and price range of each
+category) are kept in the CategoryFacet summary table, so showing them
+costs a read of one row per category instead of a GROUP BY over the
+catalog.
+
+Catalog changes schedule a refresh of the summary as a background task,
+so the counts only move while the run_tasks worker is running. Refreshes
+are coalesced: every change within the same FACETS_REFRESH_INTERVAL
+seconds is covered by a single task that runs at the end of that window.
+With TASKS_EAGER the refresh runs right after the first change of a
+window; later changes in it mark the facets dirty, and the first
+get_facets() after the window refreshes them. Units held by carts only
+move the in-stock counts at the next refresh.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from tasks.queue import enqueue
+from .cache import get_catalog_cache
+from .filters import IN_STOCK
+from .models import CategoryFacet, Product
+
+FACETS_KEY = 'catalog:facets'
+# Window of the last change not covered by an eager refresh
+DIRTY_KEY = 'catalog:facets:dirty'
+
+REFRESH_TASK = 'products.tasks.refresh_category_facets'
+
+def refresh_facets():
+    """
+    Recompute the facets of every category with one GROUP BY and cache them.
+    """
+    # Changes made from here on are covered by the next refresh
+    get_catalog_cache().delete(DIRTY_KEY)
+    rows = Product.objects.order_by().values('category').annotate(
+        product_count=Count('id'),
+        in_stock_count=Count('id', filter=IN_STOCK),
+        min_price=Min('price'),
+        max_price=Max('price'),
+    )
+    facets = [CategoryFacet(**row) for row in rows]
+    with transaction.atomic():
+        CategoryFacet.objects.bulk_create(
+            facets,
+            update_conflicts=True,
+            unique_fields=['category'],
+            update_fields=['product_count', 'in_stock_count', 'min_price', 'max_price', 'updated_at'],
+        )
+        CategoryFacet.objects.exclude(category__in=[facet.category for facet in facets]).delete()
+    # Read back, so cached prices have the same scale as stored ones
+    facets = list(CategoryFacet.objects.order_by('category'))
+    get_catalog_cache().set(FACETS_KEY, facets, settings.FACETS_REFRESH_INTERVAL)
+    return facets
+
+def get_facets():
+    """
+    Return the CategoryFacet of every category that has products, keyed by category.
+    
+    The summary is cached for FACETS_REFRESH_INTERVAL seconds, the
+    staleness it already has, so refreshes made by the worker process
+    show up without any invalidation. Requests never fill an empty
+    summary; migrate and import_products do (see seed_facets).
+    """
+    cache = get_catalog_cache()
+    if settings.TASKS_EAGER:
+        dirty = cache.get(DIRTY_KEY)
+        if dirty is not None and dirty < _window():
+            facets = refresh_facets()
+            return {facet.category: facet for facet in facets}
+    facets = cache.get(FACETS_KEY)
+    if facets is None:
+        facets = list(CategoryFacet.objects.order_by('category'))
+        cache.set(FACETS_KEY, facets, settings.FACETS_REFRESH_INTERVAL)
+    return {facet.category: facet for facet in facets}
+
+def seed_facets(sender=None, **kwargs):
+    """
+    Fill the facets of products that were loaded without a refresh, e.g. after migrate.
+    """
+    refresh_facets()
+
+def _window(now=None):
+    return int((time.time() if now is None else now) // settings.FACETS_REFRESH_INTERVAL)
+
+def schedule_facet_refresh():
+    """
+    Queue a refresh of the facets at the end of the current refresh window.
+    
+    The idempotency key names the window, so the first change in it queues
+    the task and the others are no-ops. Eager tasks cannot be delayed, so
+    in that mode the first change refreshes at once and the others mark
+    the facets dirty for get_facets().
+    """
+    interval = settings.FACETS_REFRESH_INTERVAL
+    now = time.time()
+    window = _window(now)
+    if settings.TASKS_EAGER:
+        get_catalog_cache().set(DIRTY_KEY, window, None)
+    enqueue(REFRESH_TASK, key=f'{REFRESH_TASK}:{window}', delay=(window + 1) * interval - now)
@@ -0,0 +1,55 @@
+"""
+Combinable filters and sort options of the product list.
+
+The list can be narrowed by category, price range and stock and sorted
+by name or price. Each combination is served by one of the Product
+indexes: (category, name, id) and its in-stock partial copy for name
+sorts, (category, price, id) and (price, id) for price sorts and ranges.
+"""
+from django.db.models import F, Q
+
+# Products that can still be put in a cart; matches product_in_stock_idx
+IN_STOCK = Q(inventory__gt=F('reserved'))
+
+# Sort option -> keyset ordering of the product pages
+SORT_ORDERINGS = {
+    'name': ('name', 'id'),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+}
+
+DEFAULT_FILTERS = {
+    'category': '',
+    'min_price': None,
+    'max_price': None,
+    'in_stock': False,
+    'sort': 'name',
+}
+
+def filter_products(queryset, filters):
+    """
+    Apply catalog filters to a queryset of products.
+    
+    Returns the filtered queryset and the keyset ordering of the requested sort.
+    """
+    filters = {**DEFAULT_FILTERS, **filters}
+    if filters['category']:
+        queryset = queryset.filter(category=filters['category'])
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters['in_stock']:
+        queryset = queryset.filter(IN_STOCK)
+    return queryset, SORT_ORDERINGS.get(filters['sort'], SORT_ORDERINGS['name'])
+
+def filter_params(filters):
+    """
+    Return the query string parameters of the filters that differ from the defaults.
+    """
+    params = {}
+    for name, default in DEFAULT_FILTERS.items():
+        value = filters.get(name, default)
+        if value != default and value is not None:
+            params[name] = 'on' if value is True else str(value)
+    return params
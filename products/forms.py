@@ -1,5 +1,7 @@
 from django import forms
-from .models import Product
+from django.db import transaction
+from .models import CategoryFacet, Product
+from .renditions import delete_unused_renditions, schedule_renditions
 
 class ProductForm(forms.ModelForm):
     """
@@ -7,29 +9,133 @@ class ProductForm(forms.ModelForm):
     """
     class Meta:
         model = Product
-        fields = ['name', 'description', 'price', 'category', 'inventory', 'image']
+        fields = ['sku', 'name', 'description', 'price', 'category', 'inventory', 'image']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
         }
+    
+    def save(self, commit=True):
+        """
+        Save the product and queue the rendering of its image sizes if the image changed.
+        
+        The renditions of the replaced image are deleted once the change is
+        committed.
+        """
+        product = super().save(commit=False)
+        image_changed = 'image' in self.changed_data
+        if image_changed:
+            product.has_renditions = False
+        if commit:
+            product.save()
+            self._save_m2m()
+            if image_changed and product.image:
+                schedule_renditions([product.pk])
+            previous = getattr(self.initial.get('image'), 'name', None)
+            if image_changed and previous:
+                transaction.on_commit(lambda: delete_unused_renditions([previous]))
+        return product
 
 class ProductFilterForm(forms.Form):
     """
-    Form for filtering products by category.
+    Form for filtering and sorting products.
+    
+    Pass the facets from products.facets.get_facets() to show the number
+    of products next to each category.
     """
+    SORT_CHOICES = [
+        ('name', 'Name'),
+        ('price', 'Price: Low to High'),
+        ('-price', 'Price: High to Low'),
+    ]
+    
     category = forms.ChoiceField(required=False)
+    min_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    in_stock = forms.BooleanField(required=False)
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, facets=None, **kwargs):
         super().__init__(*args, **kwargs)
-        # Use the predefined category choices from the Product model with icons
-        category_icons = {
-            '': '<i class="fas fa-th-large"></i> All Categories',
-            'Laptop': '<i class="fas fa-laptop"></i> Laptop',
-            'Graphics Card': '<i class="fas fa-microchip"></i> Graphics Card',
-            'Game Console': '<i class="fas fa-gamepad"></i> Game Console',
-            'Monitor': '<i class="fas fa-desktop"></i> Monitor',
-            'Mobile': '<i class="fas fa-mobile-alt"></i> Mobile'
+        self.facets = facets
+        counts = {category: facet.product_count for category, facet in (facets or {}).items()}
+        options = [('', 'fa-th-large', 'All Categories', sum(counts.values()))] + [
+            (value, Product.CATEGORY_ICONS[value], label, counts.get(value, 0))
+            for value, label in Product.CATEGORY_CHOICES
+        ]
+        # Choices with icons, and counts when facets are given
+        self.fields['category'].choices = [
+            (value, f'<i class="fas {icon}"></i> {label}' + (f' ({count})' if facets is not None else ''))
+            for value, icon, label, count in options
+        ]
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        min_price, max_price = cleaned_data.get('min_price'), cleaned_data.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            self.add_error('max_price', "The maximum price must not be below the minimum price.")
+        return cleaned_data
+    
+    def get_filters(self):
+        """
+        Return the filters for products.filters; fields that do not validate are left out.
+        """
+        self.is_valid()
+        return {
+            name: value for name, value in self.cleaned_data.items()
+            if value not in (None, '')
         }
-        
-        # Create choices with icons
-        category_choices = [(key, category_icons[key]) for key in [''] + [choice[0] for choice in Product.CATEGORY_CHOICES]]
-        self.fields['category'].choices = category_choices
\ No newline at end of file
+    
+    def get_facet(self):
+        """
+        Return the facet of the selected category, or the totals of all categories.
+        """
+        if self.facets is None:
+            return None
+        category = self.cleaned_data.get('category') if hasattr(self, 'cleaned_data') else ''
+        if category:
+            return self.facets.get(category)
+        facets = list(self.facets.values())
+        return CategoryFacet(
+            product_count=sum(facet.product_count for facet in facets),
+            in_stock_count=sum(facet.in_stock_count for facet in facets),
+            min_price=min((facet.min_price for facet in facets if facet.min_price is not None), default=None),
+            max_price=max((facet.max_price for facet in facets if facet.max_price is not None), default=None),
+        )
+
+class ProductStockForm(forms.Form):
+    """
+    One row of the staff product list: the editable price and inventory of a product.
+    
+    The values the row was rendered with travel along, so saving a stale
+    list does not overwrite changes made since.
+    """
+    id = forms.IntegerField(widget=forms.HiddenInput)
+    price = forms.DecimalField(min_value=0, max_digits=10, decimal_places=2)
+    inventory = forms.IntegerField(min_value=0)
+    original_price = forms.DecimalField(max_digits=10, decimal_places=2, widget=forms.HiddenInput)
+    original_inventory = forms.IntegerField(widget=forms.HiddenInput)
+
+ProductStockFormSet = forms.formset_factory(ProductStockForm, extra=0)
+
+class ProductBulkActionForm(forms.Form):
+    """
+    Action applied to the products selected in the staff product list.
+    """
+    DELETE = 'delete'
+    SET_CATEGORY = 'set_category'
+    ACTION_CHOICES = [
+        ('', '---------'),
+        (DELETE, 'Delete selected products'),
+        (SET_CATEGORY, 'Move selected products to category'),
+    ]
+    
+    action = forms.ChoiceField(choices=ACTION_CHOICES, widget=forms.Select(attrs={'class': 'form-select w-auto'}))
+    category = forms.ChoiceField(choices=[('', '---------')] + Product.CATEGORY_CHOICES, required=False)
+    # The checkboxes are rendered by the list itself, one per row
+    selected = forms.ModelMultipleChoiceField(queryset=Product.objects.only('id'))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == self.SET_CATEGORY and not cleaned_data.get('category'):
+            self.add_error('category', "Choose the category to move the products to.")
+        return cleaned_data
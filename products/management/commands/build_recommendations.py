@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from products.recommendations import RECOMMENDATIONS_PER_PRODUCT, build_recommendations, save_recommendations
+
+
+class Command(BaseCommand):
+    help = "Precompute the also-bought and related products of the catalog from orders and carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=RECOMMENDATIONS_PER_PRODUCT,
+                            help="Recommendations kept per product and list.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and rebuild every INTERVAL seconds instead of once.")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            snapshot = save_recommendations(build_recommendations(options['limit']))
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f"Built recommendations for {snapshot.product_count} product(s) "
+                f"({len(snapshot.data)} bytes) in {elapsed:.2f}s."
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
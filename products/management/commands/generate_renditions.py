@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.renditions import render_in_worker
+
+
+class Command(BaseCommand):
+    help = "Generate the resized WebP/JPEG renditions of existing product images in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of worker threads.")
+        parser.add_argument('--batch-size', type=int, default=20, help="Products rendered per task.")
+        parser.add_argument('--force', action='store_true', help="Re-render renditions that already exist.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            products = products.filter(has_renditions=False)
+        ids = list(products.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+        self.stdout.write(f"Rendering images of {len(ids)} product(s) with {options['workers']} worker(s)...")
+
+        rendered = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(render_in_worker, batch, options['force']) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    rendered += len(future.result())
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"A batch failed: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Rendered images of {rendered} product(s)."))
+        if failed:
+            self.stderr.write(f"{failed} batch(es) failed; run the command again to retry them.")
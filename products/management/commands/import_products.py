@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products.catalog_io import DEFAULT_CHUNK_SIZE, ProductImporter, read_rows
+from products.facets import refresh_facets
+
+# Number of invalid rows reported individually
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Import products from a CSV or JSONL file, creating or updating them by SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file with the columns sku, name, description, "
+                                         "price, category, inventory and image.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="File format (default: from the extension).")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Rows upserted per transaction.")
+        parser.add_argument('--image-root', help="Directory that relative image paths are resolved against.")
+
+    def handle(self, *args, **options):
+        importer = ProductImporter(chunk_size=options['chunk_size'], image_root=options['image_root'])
+        start = time.perf_counter()
+        try:
+            importer.run(read_rows(options['path'], options['format']))
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['path']}: {error}")
+        # Show the imported products in the facets without waiting for the worker
+        refresh_facets()
+        elapsed = time.perf_counter() - start
+
+        for line_number, message in importer.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"Line {line_number}: {message}")
+        if len(importer.errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f"... and {len(importer.errors) - MAX_REPORTED_ERRORS} more invalid row(s).")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.created + importer.updated} product(s) in {elapsed:.1f}s: "
+            f"{importer.created} created, {importer.updated} updated, {len(importer.errors)} skipped."
+        ))
+        if importer.images:
+            self.stdout.write(f"{importer.images} product image(s) changed; run generate_renditions to resize them.")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.search import fts_enabled, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of the product catalog."
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("The search index needs an SQLite database with FTS5.")
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -30,21 +30,68 @@ class Product(models.Model):
         MOBILE: 'Mobile',
     }
     
+    # Font Awesome icons shown next to each category in the filters
+    CATEGORY_ICONS = {
+        LAPTOP: 'fa-laptop',
+        GRAPHICS_CARD: 'fa-microchip',
+        GAME_CONSOLE: 'fa-gamepad',
+        MONITOR: 'fa-desktop',
+        MOBILE: 'fa-mobile-alt',
+    }
+    
     def category_image_path(instance, filename):
         """Generate the path for the image based on the product category"""
         category_folder = Product.CATEGORY_FOLDERS.get(instance.category, 'products')
         return os.path.join('product pictures', category_folder, filename)
     
+    # Stock keeping unit; the key used by catalog imports from the ERP
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=100, choices=CATEGORY_CHOICES)
     inventory = models.PositiveIntegerField(default=0)
+    # Units held by carts (see cart.models.Reservation), maintained with F()
+    # updates alongside the holds so availability never needs an aggregate
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     image = models.ImageField(upload_to=category_image_path, null=True, blank=True)
+    # Set once the resized renditions of the image have been generated
+    has_renditions = models.BooleanField(default=False, editable=False)
+    # Bumped by every change, including F() updates of the stock; keys the
+    # template fragment cache and the conditional GET validators
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Keyset pages of the whole catalog and the admin list, ordered by name
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            # Keyset pages of one category
+            models.Index(fields=['category', 'name', 'id'], name='product_category_name_idx'),
+            # In-stock products of one category; the condition is the one
+            # products.facets filters on, so the planner can match it
+            models.Index(
+                fields=['category', 'name', 'id'],
+                condition=models.Q(inventory__gt=models.F('reserved')),
+                name='product_in_stock_idx',
+            ),
+            # Keyset pages sorted by price, and price ranges
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='product_category_price_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # reserved is only changed by F() updates of the reservation code; a
+        # full save of an instance loaded earlier must not write it back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+            ]
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         return reverse('product_detail', args=[str(self.id)])
     
@@ -57,13 +104,53 @@ class Product(models.Model):
     def update_stock(self, quantity):
         """
         Update the inventory stock of the product.
+        
+        The change is applied as an F() expression in the database so that
+        concurrent updates are not lost.
         """
-        self.inventory += quantity
-        self.save()
+        self.inventory = models.F('inventory') + quantity
+        self.save(update_fields=['inventory', 'updated_at'])
+        self.refresh_from_db(fields=['inventory'])
         return self.inventory
         
+    @property
+    def available(self):
+        """
+        Units that can still be put in a cart: the inventory minus the units held by carts.
+        """
+        return max(self.inventory - self.reserved, 0)
+    
     def is_available(self):
         """
-        Check if the product is available (has inventory > 0).
+        Check if the product is available (has unreserved inventory).
         """
-        return self.inventory > 0
\ No newline at end of file
+        return self.available > 0
+
+class CategoryFacet(models.Model):
+    """
+    Precomputed counts and price range of one category.
+    
+    Maintained by products.facets.refresh_facets so the catalog filters
+    can show them without aggregating over the products.
+    """
+    category = models.CharField(max_length=100, choices=Product.CATEGORY_CHOICES, unique=True)
+    product_count = models.PositiveIntegerField(default=0)
+    # Products with units that are not held by carts
+    in_stock_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.category}: {self.product_count} products"
+
+class RecommendationSnapshot(models.Model):
+    """
+    A batch-built products.recommendations.Recommendations table in its serialized form.
+    """
+    data = models.BinaryField()
+    product_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Recommendations for {self.product_count} products ({self.created_at:%Y-%m-%d %H:%M})"
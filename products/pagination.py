@@ -0,0 +1,109 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+class KeysetPage:
+    """
+    One page of results from a KeysetPaginator.
+    """
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        return self.next_cursor is not None
+
+class KeysetPaginator:
+    """
+    Seek (keyset) pagination over a queryset.
+    
+    Pages are selected with a WHERE clause on the last row of the previous
+    page instead of an OFFSET, so fetching a deep page costs the same as
+    fetching the first one. The ordering must end with a unique field.
+    """
+    def __init__(self, queryset, ordering=('name', 'id'), per_page=24):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.per_page = per_page
+    
+    def get_page(self, cursor=None):
+        """
+        Return the page that follows the given cursor (the first page if None).
+        """
+        rows = list(self._page_queryset(cursor))
+        return self._make_page(rows)
+    
+    async def aget_page(self, cursor=None):
+        """
+        Async version of get_page() that streams the rows with aiterator().
+        """
+        rows = [obj async for obj in self._page_queryset(cursor).aiterator()]
+        return self._make_page(rows)
+    
+    def _page_queryset(self, cursor):
+        queryset = self.queryset
+        values = decode_cursor(cursor, len(self.ordering))
+        if values is not None:
+            try:
+                queryset = queryset.filter(self._seek_filter(values))
+            except (ValidationError, ValueError, TypeError):
+                # A forged cursor whose values do not fit the fields starts over
+                pass
+        # One extra row tells whether there is a next page
+        return queryset[:self.per_page + 1]
+    
+    def _make_page(self, rows):
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor([self._value(rows[-1], field) for field in self.ordering])
+        return KeysetPage(rows, next_cursor)
+    
+    def _seek_filter(self, values):
+        """
+        Build (a > x) OR (a = x AND b > y) OR ... for the ordering fields.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+    
+    @staticmethod
+    def _value(obj, field):
+        value = getattr(obj, field.lstrip('-'))
+        return value if isinstance(value, (int, str)) else str(value)
+
+def encode_cursor(values):
+    """
+    Encode the ordering values of a row as an opaque URL-safe cursor.
+    """
+    data = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def decode_cursor(cursor, size):
+    """
+    Decode a cursor, returning None if it is missing or malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    if not all(isinstance(value, (int, str)) for value in values):
+        return None
+    return values
@@ -0,0 +1,247 @@
+"""
+"Customers also bought", related and recently viewed products.
+
+build_recommendations() runs in batch (see the build_recommendations
+command). It counts how often two products were ordered or carted
+together and keeps the best partners of every product, along with the
+products of the same category closest to it in price. The result is a
+Recommendations table: a sorted array of product ids and, for each list,
+CSR-style offsets into one flat array of recommended ids. All of them are
+array('I') buffers, stored as a single RecommendationSnapshot row.
+
+Server processes keep the latest snapshot in memory and look for a newer
+one at most every RECOMMENDATIONS_RELOAD_INTERVAL seconds, so a lookup is
+a bisect and a slice. Recently viewed products are a short LRU list per
+user (or per session) in the sessions cache. Neither reads the database
+while a page is rendered.
+"""
+import heapq
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from cart.models import CartItem, OrderItem
+from .models import Product, RecommendationSnapshot
+
+# Recommendations kept per product and list
+RECOMMENDATIONS_PER_PRODUCT = 12
+# A shared order says more about two products than a shared cart
+ORDER_WEIGHT = 2
+CART_WEIGHT = 1
+# Products of a basket that are paired up; keeps huge baskets from dominating the build
+MAX_BASKET_SIZE = 50
+
+# Products remembered per visitor, most recent first
+RECENTLY_VIEWED_SIZE = 12
+RECENTLY_VIEWED_TIMEOUT = 30 * 24 * 60 * 60
+
+class Recommendations:
+    """
+    The recommended products of every product, in compact arrays.
+    """
+    LISTS = ('also_bought', 'related')
+    
+    def __init__(self, product_ids=None, lists=None):
+        self.product_ids = product_ids if product_ids is not None else array('I')
+        # List name -> (offsets, ids); the recommendations of product_ids[i]
+        # are ids[offsets[i]:offsets[i + 1]], best first
+        self.lists = lists or {
+            name: (array('I', [0] * (len(self.product_ids) + 1)), array('I')) for name in self.LISTS
+        }
+    
+    def __len__(self):
+        return len(self.product_ids)
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build the table from {product_id: {list name: [recommended ids]}}.
+        """
+        product_ids = array('I', sorted(rows))
+        lists = {}
+        for name in cls.LISTS:
+            offsets, ids = array('I', [0]), array('I')
+            for pk in product_ids:
+                ids.extend(rows[pk].get(name, ()))
+                offsets.append(len(ids))
+            lists[name] = (offsets, ids)
+        return cls(product_ids, lists)
+    
+    def get(self, name, product_id, limit=None):
+        """
+        Return the ids recommended for a product in the given list, best first.
+        """
+        index = bisect_left(self.product_ids, product_id)
+        if index == len(self.product_ids) or self.product_ids[index] != product_id:
+            return []
+        offsets, ids = self.lists[name]
+        start, end = offsets[index], offsets[index + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return ids[start:end].tolist()
+    
+    def _arrays(self):
+        return [self.product_ids] + [part for name in self.LISTS for part in self.lists[name]]
+    
+    def to_bytes(self):
+        """
+        Serialize as the array lengths followed by the arrays, little-endian.
+        """
+        arrays = self._arrays()
+        header = struct.pack(f'<{len(arrays)}I', *(len(part) for part in arrays))
+        body = []
+        for part in arrays:
+            if sys.byteorder == 'big':
+                part = array('I', part)
+                part.byteswap()
+            body.append(part.tobytes())
+        return header + b''.join(body)
+    
+    @classmethod
+    def from_bytes(cls, data):
+        count = 1 + 2 * len(cls.LISTS)
+        lengths = struct.unpack_from(f'<{count}I', data)
+        position = struct.calcsize(f'<{count}I')
+        arrays = []
+        for length in lengths:
+            part = array('I')
+            part.frombytes(data[position:position + length * part.itemsize])
+            if sys.byteorder == 'big':
+                part.byteswap()
+            arrays.append(part)
+            position += length * part.itemsize
+        lists = {name: (arrays[1 + 2 * n], arrays[2 + 2 * n]) for n, name in enumerate(cls.LISTS)}
+        return cls(arrays[0], lists)
+
+def _baskets(queryset, basket_field):
+    """
+    Yield the distinct product ids of each basket (order or cart) of a queryset of line items.
+    """
+    rows = queryset.order_by(basket_field).values_list(basket_field, 'product_id').iterator(chunk_size=2000)
+    for basket_id, items in groupby(rows, key=itemgetter(0)):
+        yield sorted({product_id for basket_id, product_id in items})[:MAX_BASKET_SIZE]
+
+def count_co_occurrences():
+    """
+    Return {product_id: Counter(partner_id: score)} over every order and cart.
+    """
+    scores = defaultdict(Counter)
+    sources = [
+        (ORDER_WEIGHT, OrderItem.objects.filter(product__isnull=False), 'order_id'),
+        (CART_WEIGHT, CartItem.objects.all(), 'cart_id'),
+    ]
+    for weight, queryset, basket_field in sources:
+        for products in _baskets(queryset, basket_field):
+            for first, second in combinations(products, 2):
+                scores[first][second] += weight
+                scores[second][first] += weight
+    return scores
+
+def nearest_in_price(limit):
+    """
+    Return {product_id: ids of up to limit products of the same category, closest in price first}.
+    """
+    related = {}
+    rows = Product.objects.order_by('category', 'price', 'id').values_list('id', 'category', 'price')
+    for category, items in groupby(rows.iterator(chunk_size=2000), key=itemgetter(1)):
+        items = [(pk, price) for pk, category, price in items]
+        for index, (pk, price) in enumerate(items):
+            # Walk outwards from the product, taking the closer neighbour each step
+            below, above, nearest = index - 1, index + 1, []
+            while len(nearest) < limit and (below >= 0 or above < len(items)):
+                if above >= len(items) or (below >= 0 and price - items[below][1] <= items[above][1] - price):
+                    nearest.append(items[below][0])
+                    below -= 1
+                else:
+                    nearest.append(items[above][0])
+                    above += 1
+            related[pk] = nearest
+    return related
+
+def build_recommendations(limit=RECOMMENDATIONS_PER_PRODUCT):
+    """
+    Compute the recommendations of every product from the orders, carts and catalog.
+    """
+    related = nearest_in_price(limit)
+    scores = count_co_occurrences()
+    rows = {}
+    for pk, nearest in related.items():
+        partners = [(partner, score) for partner, score in scores.get(pk, {}).items() if partner in related]
+        best = heapq.nlargest(limit, partners, key=lambda item: (item[1], -item[0]))
+        rows[pk] = {'also_bought': [partner for partner, score in best], 'related': nearest}
+    return Recommendations.from_rows(rows)
+
+def save_recommendations(recommendations):
+    """
+    Store a new snapshot and drop the older ones.
+    """
+    with transaction.atomic():
+        snapshot = RecommendationSnapshot.objects.create(
+            data=recommendations.to_bytes(), product_count=len(recommendations),
+        )
+        RecommendationSnapshot.objects.filter(pk__lt=snapshot.pk).delete()
+    return snapshot
+
+class RecommendationStore:
+    """
+    The latest snapshot of this process, checked for a newer one every RECOMMENDATIONS_RELOAD_INTERVAL seconds.
+    """
+    def __init__(self):
+        self.recommendations = Recommendations()
+        self.snapshot_id = None
+        self.checked_at = None
+        self._lock = threading.Lock()
+    
+    def get(self):
+        if self._is_due():
+            with self._lock:
+                if self._is_due():
+                    self._reload()
+        return self.recommendations
+    
+    def _is_due(self):
+        return self.checked_at is None or time.monotonic() - self.checked_at >= settings.RECOMMENDATIONS_RELOAD_INTERVAL
+    
+    def _reload(self):
+        latest = RecommendationSnapshot.objects.order_by('-id').values_list('id', flat=True).first()
+        if latest != self.snapshot_id:
+            data = RecommendationSnapshot.objects.filter(pk=latest).values_list('data', flat=True).first()
+            self.recommendations = Recommendations.from_bytes(bytes(data)) if data is not None else Recommendations()
+            self.snapshot_id = latest
+        self.checked_at = time.monotonic()
+
+store = RecommendationStore()
+
+def get_recommendations():
+    return store.get()
+
+def _recently_viewed_key(request):
+    if request.user.is_authenticated:
+        return f'recent:user:{request.user.pk}'
+    if request.session.session_key:
+        return f'recent:session:{request.session.session_key}'
+    # Visitors without a session are not tracked; creating one would write to the database
+    return None
+
+def record_view(request, product_id):
+    """
+    Move a product to the front of the visitor's recently viewed list and return the list.
+    """
+    key = _recently_viewed_key(request)
+    if key is None:
+        return [product_id]
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    recent = cache.get(key) or []
+    if recent[:1] != [product_id]:
+        recent = ([product_id] + [pk for pk in recent if pk != product_id])[:RECENTLY_VIEWED_SIZE]
+        cache.set(key, recent, RECENTLY_VIEWED_TIMEOUT)
+    return recent
@@ -0,0 +1,174 @@
+"""
+Pre-generated image renditions for product pictures.
+
+Every uploaded product image is resized to a few fixed bounding boxes
+and saved next to the media tree as WebP and JPEG, so pages can serve
+an image close to its display size instead of the full upload. New
+uploads are rendered by the run_tasks worker (see schedule_renditions),
+and the renditions of a replaced image are deleted once no product uses
+it (see delete_unused_renditions).
+"""
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, ImageOps
+from tasks.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> longest side in pixels
+RENDITION_SIZES = {
+    'thumb': 100,
+    'card': 400,
+    'detail': 800,
+}
+
+# File extension -> Pillow format and encoder options
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# Renditions offered in a srcset for each requested size, smallest first
+RENDITION_LADDER = {
+    'thumb': ['thumb', 'card'],
+    'card': ['card', 'detail'],
+    'detail': ['detail'],
+}
+
+# Default "sizes" attribute: the width each rendition is displayed at
+RENDITION_DISPLAY_SIZES = {
+    'thumb': '50px',
+    'card': '(max-width: 576px) 100vw, 300px',
+    'detail': '(max-width: 768px) 100vw, 600px',
+}
+
+RENDITION_ROOT = 'renditions'
+
+RENDER_TASK = 'products.tasks.render_product_renditions'
+
+def rendition_name(image_name, size, extension):
+    """
+    Return the storage name of one rendition of an image.
+    
+    The whole source name, extension included, is kept, so foo.png and
+    foo.jpg do not share renditions.
+    """
+    return f"{RENDITION_ROOT}/{size}/{image_name}.{extension}"
+
+def rendition_url(image_name, size, extension):
+    return default_storage.url(rendition_name(image_name, size, extension))
+
+def rendition_srcset(image_name, size, extension):
+    """
+    Return a srcset with the given size and the larger ones for dense screens.
+    """
+    return ', '.join(
+        f"{rendition_url(image_name, name, extension)} {RENDITION_SIZES[name]}w"
+        for name in RENDITION_LADDER[size]
+    )
+
+def _encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel, so flatten transparent images onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+def generate_renditions(image_name, storage=default_storage, force=False):
+    """
+    Render every size and format of an image. Returns the number of files written.
+    
+    Existing renditions are kept unless force is True.
+    """
+    written = 0
+    with storage.open(image_name, 'rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    for size, longest_side in RENDITION_SIZES.items():
+        image = original.copy()
+        image.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in RENDITION_FORMATS.items():
+            name = rendition_name(image_name, size, extension)
+            if storage.exists(name):
+                if not force:
+                    continue
+                storage.delete(name)
+            storage.save(name, ContentFile(_encode(image, image_format, options)))
+            written += 1
+    return written
+
+def delete_unused_renditions(image_names, storage=default_storage):
+    """
+    Delete the renditions of images that no product uses any more. Returns the number of files deleted.
+    
+    Imports share a stored image between products, so the renditions of an
+    image are kept until the last product using it moved to another one.
+    """
+    from .models import Product
+
+    image_names = set(image_names) - {''}
+    unused = image_names - set(Product.objects.filter(image__in=image_names).values_list('image', flat=True))
+    deleted = 0
+    for image_name in unused:
+        for size in RENDITION_SIZES:
+            for extension in RENDITION_FORMATS:
+                name = rendition_name(image_name, size, extension)
+                if storage.exists(name):
+                    storage.delete(name)
+                    deleted += 1
+    return deleted
+
+def render_product_images(product_ids, force=False):
+    """
+    Render the images of the given products and mark them as ready.
+    
+    An image that fails to render is logged and skipped; its product keeps
+    serving the original upload until generate_renditions is run again.
+    """
+    from .models import Product
+    from .signals import catalog_changed
+
+    ready = []
+    for product_id, image_name in Product.objects.filter(pk__in=product_ids).exclude(image='').values_list('id', 'image'):
+        if not image_name:
+            continue
+        try:
+            generate_renditions(image_name, force=force)
+        except Exception:
+            logger.exception("Could not render the image %s of product %s.", image_name, product_id)
+            continue
+        ready.append(product_id)
+    if ready:
+        Product.objects.filter(pk__in=ready).update(has_renditions=True, updated_at=timezone.now())
+        catalog_changed.send(sender=Product, product_ids=ready, reindex_ids=[])
+    return ready
+
+def render_in_worker(product_ids, force=False):
+    """
+    Run render_product_images on a worker thread, closing its database connection afterwards.
+    """
+    try:
+        return render_product_images(product_ids, force)
+    finally:
+        connections.close_all()
+
+def schedule_renditions(product_ids, force=False):
+    """
+    Queue the rendering of the given products' images for the run_tasks worker.
+    
+    The task is queued in the caller's transaction, so it only runs once
+    the new images are committed.
+    """
+    enqueue(RENDER_TASK, {'product_ids': list(product_ids), 'force': force})
@@ -0,0 +1,183 @@
+import re
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Q
+from .models import Product
+
+# FTS5 virtual table mirroring the searchable product columns; its rowid
+# is the product id. Created after migrate (or by rebuild_search_index)
+# and kept in sync by the catalog_changed signal.
+FTS_TABLE = 'products_product_fts'
+# Product fields copied into the index; changes to other fields skip re-indexing
+SEARCH_FIELDS = frozenset(['name', 'description', 'category'])
+
+# Relative weight of matches in the name and description columns
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+INDEX_CHUNK_SIZE = 500
+
+# Prefix indexes keep short prefix queries off a term-range scan
+CREATE_FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, category UNINDEXED, tokenize='unicode61', prefix='2 3 4')"
+)
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+class SearchResults:
+    """
+    One page of search results with per-category facet counts.
+    """
+    def __init__(self, products, total, facets, page, per_page):
+        self.products = products
+        self.total = total
+        self.facets = facets
+        self.page = page
+        self.per_page = per_page
+    
+    def __iter__(self):
+        return iter(self.products)
+    
+    def __len__(self):
+        return len(self.products)
+    
+    def has_previous(self):
+        return self.page > 1
+    
+    def has_next(self):
+        return self.page * self.per_page < self.total
+
+def fts_enabled():
+    """
+    Return True if the database supports the FTS5 search index.
+    """
+    return connection.vendor == 'sqlite'
+
+def ensure_search_index():
+    """
+    Create the FTS5 table if it does not exist yet. Returns True if it was created.
+    """
+    if not fts_enabled():
+        return False
+    with connection.cursor() as cursor:
+        exists = FTS_TABLE in connection.introspection.table_names(cursor)
+        if not exists:
+            cursor.execute(CREATE_FTS_TABLE)
+    return not exists
+
+def rebuild_search_index():
+    """
+    Re-index every product.
+    """
+    if not fts_enabled():
+        return
+    ensure_search_index()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category) "
+            f"SELECT id, name, description, category FROM {Product._meta.db_table}"
+        )
+
+def index_products(product_ids):
+    """
+    Refresh the index rows of the given products, dropping deleted ones.
+    
+    The rows are replaced in one transaction, so concurrent re-indexes of
+    the same product wait for each other instead of colliding on its rowid.
+    """
+    if not fts_enabled() or not product_ids:
+        return
+    product_ids = [int(pk) for pk in product_ids]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Chunked to stay under SQLite's limit on query parameters
+        for start in range(0, len(product_ids), INDEX_CHUNK_SIZE):
+            chunk = product_ids[start:start + INDEX_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description, category) "
+                f"SELECT id, name, description, category FROM {Product._meta.db_table} "
+                f"WHERE id IN ({placeholders})",
+                chunk,
+            )
+
+def build_match_query(query):
+    """
+    Turn free text into an FTS5 query where every word is a quoted prefix term.
+    """
+    terms = TERM_RE.findall(query.lower())
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+def search_products(query, category='', page=1, per_page=24):
+    """
+    Search the catalog, ranking name matches above description matches.
+    
+    Returns SearchResults whose facets map each category to its number of
+    matches; the category filter narrows the products but not the facets.
+    """
+    match = build_match_query(query)
+    if not match:
+        return SearchResults([], 0, {}, page, per_page)
+    if fts_enabled():
+        try:
+            return _search_fts(match, category, page, per_page)
+        except DatabaseError:
+            # The index has not been created yet
+            pass
+    return _search_like(query, category, page, per_page)
+
+def _search_fts(match, category, page, per_page):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT category, COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s GROUP BY category",
+            [match],
+        )
+        facets = dict(cursor.fetchall())
+        params = [match]
+        category_filter = ''
+        if category:
+            category_filter = 'AND category = %s'
+            params.append(category)
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {category_filter} "
+            f"ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) LIMIT %s OFFSET %s",
+            params + [per_page, (page - 1) * per_page],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    products = Product.objects.in_bulk(ids)
+    total = facets.get(category, 0) if category else sum(facets.values())
+    return SearchResults([products[pk] for pk in ids if pk in products], total, facets, page, per_page)
+
+def _search_like(query, category, page, per_page):
+    """
+    Unindexed fallback for databases without FTS5.
+    """
+    condition = Q()
+    for term in TERM_RE.findall(query):
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    matches = Product.objects.filter(condition)
+    facets = dict(matches.values_list('category').annotate(count=Count('id')).order_by())
+    if category:
+        matches = matches.filter(category=category)
+    total = facets.get(category, 0) if category else sum(facets.values())
+    start = (page - 1) * per_page
+    return SearchResults(list(matches.order_by('name', 'id')[start:start + per_page]), total, facets, page, per_page)
+
+def search_queryset(queryset, query):
+    """
+    Narrow a Product queryset to the matches of query, annotated with their search_rank.
+    
+    The index is joined into the query itself, so no list of ids is bound
+    into it however many products match; ordering by search_rank puts the
+    best matches first. Returns None when the index cannot be used.
+    """
+    match = build_match_query(query)
+    if not match or not fts_enabled() or FTS_TABLE not in connection.introspection.table_names():
+        return None
+    return queryset.extra(
+        select={'search_rank': f"bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})"},
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {Product._meta.db_table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+    )
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .cache import STOCK_FIELDS, invalidate_catalog, invalidate_stock
+from .events import publish_product_changes
+from .facets import schedule_facet_refresh
+from .search import SEARCH_FIELDS, ensure_search_index, index_products, rebuild_search_index
+from .models import Product
+
+# Sent whenever products change, including bulk updates that bypass
+# post_save. Receivers get the changed primary keys as product_ids.
+# Senders that only touched stock, prices or images pass the products
+# whose searchable fields changed as reindex_ids (usually none). Senders
+# that only moved stock (STOCK_FIELDS) pass stock_only=True, which keeps
+# the rest of the catalog cache warm.
+catalog_changed = Signal()
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, origin=None, update_fields=None, **kwargs):
+    """
+    Announce single-product saves and deletes as catalog changes.
+    """
+    if isinstance(origin, QuerySet):
+        # Queryset deletes (see products.bulk) announce all their products at once
+        return
+    reindex_ids = None
+    if update_fields is not None and SEARCH_FIELDS.isdisjoint(update_fields):
+        reindex_ids = []
+    stock_only = update_fields is not None and set(update_fields) <= set(STOCK_FIELDS)
+    catalog_changed.send(sender=Product, product_ids=[instance.pk], reindex_ids=reindex_ids, stock_only=stock_only)
+
+@receiver(catalog_changed)
+def invalidate_catalog_cache(sender, product_ids=None, stock_only=False, **kwargs):
+    """
+    Invalidate the catalog cache, or only the stock of the products, once the change is committed.
+    """
+    if stock_only and product_ids:
+        ids = list(product_ids)
+        transaction.on_commit(lambda: invalidate_stock(ids))
+    else:
+        transaction.on_commit(invalidate_catalog)
+
+@receiver(catalog_changed)
+def update_search_index(sender, product_ids=None, reindex_ids=None, stock_only=False, **kwargs):
+    """
+    Re-index the changed products once the change is committed.
+    
+    Without reindex_ids every changed product is re-indexed. A failure is
+    logged instead of failing the request, whose change is already committed.
+    """
+    if stock_only:
+        return
+    ids = product_ids if reindex_ids is None else reindex_ids
+    if ids:
+        ids = list(ids)
+        transaction.on_commit(lambda: index_products(ids), robust=True)
+    elif reindex_ids is None:
+        transaction.on_commit(rebuild_search_index, robust=True)
+
+@receiver(catalog_changed)
+def notify_product_subscribers(sender, product_ids=None, **kwargs):
+    """
+    Push the new prices and stock of the changed products to the open event streams.
+    """
+    publish_product_changes(product_ids)
+
+@receiver(catalog_changed)
+def refresh_category_facets(sender, **kwargs):
+    """
+    Schedule a refresh of the category counts and price ranges.
+    """
+    schedule_facet_refresh()
+
+def create_search_index(sender, **kwargs):
+    """
+    Create and fill the search index after migrate if it does not exist yet.
+    """
+    if ensure_search_index():
+        rebuild_search_index()
@@ -0,0 +1,17 @@
+from tasks.queue import task
+from .facets import refresh_facets
+from .renditions import render_product_images
+
+@task
+def refresh_category_facets():
+    """
+    Recompute the category facets after catalog changes.
+    """
+    refresh_facets()
+
+@task
+def render_product_renditions(product_ids, force=False):
+    """
+    Render the image sizes of newly uploaded product pictures.
+    """
+    render_product_images(product_ids, force)
@@ -0,0 +1,27 @@
+from django import template
+from ..renditions import RENDITION_DISPLAY_SIZES, rendition_srcset, rendition_url
+
+register = template.Library()
+
+@register.inclusion_tag('products/includes/product_image.html')
+def product_image(product, size='card', css_class='', sizes=None, loading='lazy'):
+    """
+    Render a product picture with WebP and JPEG srcsets of its renditions.
+    
+    Falls back to the original upload until the renditions are generated.
+    """
+    context = {
+        'product': product,
+        'css_class': css_class,
+        'size': size,
+        'loading': loading,
+    }
+    if product.image and product.has_renditions:
+        name = product.image.name
+        context.update({
+            'src': rendition_url(name, size, 'jpg'),
+            'srcset_webp': rendition_srcset(name, size, 'webp'),
+            'srcset_jpg': rendition_srcset(name, size, 'jpg'),
+            'sizes': sizes or RENDITION_DISPLAY_SIZES[size],
+        })
+    return context
@@ -0,0 +1,279 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from benchmarks.query_plans import explain, find_problems
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from cart.checkout import place_order
+from cart.models import Cart
+from .cache import get_catalog_cache, get_catalog_version, get_product, get_product_page
+from .facets import get_facets, refresh_facets
+from .forms import ProductForm
+from .models import Product
+from .pagination import encode_cursor
+from .renditions import RENDITION_FORMATS, RENDITION_SIZES, generate_renditions, rendition_name
+from .recommendations import build_recommendations, get_recommendations, save_recommendations, store
+from .search import rebuild_search_index
+
+
+@override_settings(TASKS_EAGER=True, FACETS_REFRESH_INTERVAL=10)
+class EagerFacetRefreshTests(TestCase):
+    """
+    In eager mode every change of a refresh window ends up in the facets.
+    """
+    def setUp(self):
+        get_catalog_cache().clear()
+    
+    def create(self, name, at):
+        with mock.patch('products.facets.time.time', return_value=at), self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name=name, description='Facet', price=Decimal('10.00'), category=Product.LAPTOP, inventory=1,
+            )
+    
+    def laptop_count(self, at):
+        with mock.patch('products.facets.time.time', return_value=at):
+            return get_facets()[Product.LAPTOP].product_count
+    
+    def test_later_changes_of_a_window_are_refreshed_after_it(self):
+        self.create('First', at=1000)
+        self.create('Second', at=1001)
+        self.assertEqual(self.laptop_count(at=1002), 1)
+        self.assertEqual(self.laptop_count(at=1011), 2)
+
+
+class StockCacheTests(TestCase):
+    """
+    Holds and checkouts refresh the cached stock without flushing the catalog cache.
+    """
+    def setUp(self):
+        get_catalog_cache().clear()
+        self.product = Product.objects.create(
+            name='Stocked', description='Cache', price=Decimal('10.00'), category=Product.LAPTOP, inventory=10,
+        )
+        self.cart = Cart.objects.create(user=User.objects.create_user('shopper'))
+        # Warm the detail and list entries
+        get_product(self.product.pk)
+        get_product_page()
+    
+    def assertCachedAvailable(self, available):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_product(self.product.pk).available, available)
+            self.assertEqual([product.available for product in get_product_page()], [available])
+    
+    def test_hold(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cart.add_item(self.product, 3)
+        self.assertCachedAvailable(7)
+    
+    def test_checkout_keeps_the_catalog_version(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cart.add_item(self.product, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.cart)
+        self.assertEqual(get_catalog_version(), version)
+        self.assertCachedAvailable(7)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.inventory, self.product.reserved), (7, 0))
+
+
+class AdminSearchTests(TestCase):
+    """
+    The admin searches the full-text index, best match first.
+    """
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.in_description = Product.objects.create(
+            name='Desk', description='A lamp holder', price=Decimal('10.00'), category=Product.LAPTOP, inventory=1,
+        )
+        self.in_name = Product.objects.create(
+            name='Lamp', description='Bright', price=Decimal('10.00'), category=Product.LAPTOP, inventory=1,
+        )
+        Product.objects.create(
+            name='Chair', description='Oak', price=Decimal('10.00'), category=Product.LAPTOP, inventory=1,
+        )
+        rebuild_search_index()
+    
+    def test_ranked_matches(self):
+        response = self.client.get(reverse('admin:products_product_changelist'), {'q': 'lamp'})
+        self.assertEqual(
+            [product.pk for product in response.context['cl'].result_list], [self.in_name.pk, self.in_description.pk],
+        )
+    
+    def test_broad_search(self):
+        Product.objects.bulk_create([
+            Product(name=f'Lamp {number}', description='Many', price=Decimal('1.00'), category=Product.LAPTOP)
+            for number in range(1000)
+        ])
+        rebuild_search_index()
+        response = self.client.get(reverse('admin:products_product_changelist'), {'q': 'lamp'})
+        self.assertEqual(response.context['cl'].result_count, 1002)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """
+    Catalog views stay within VIEW_QUERY_BUDGETS on a cold cache, for a user without a cart yet.
+    """
+    def setUp(self):
+        self.products = [
+            Product.objects.create(
+                name=f'Budget {number}', description='Budget', price=Decimal('10.00'),
+                category=Product.LAPTOP, inventory=5,
+            )
+            for number in range(30)
+        ]
+        rebuild_search_index()
+        save_recommendations(build_recommendations())
+        # Make the next page load the snapshot
+        store.checked_at = None
+        self.client.force_login(User.objects.create_user('shopper'))
+        get_catalog_cache().clear()
+        caches['sessions'].clear()
+    
+    def assertWithinBudget(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertLess(response.status_code, 400)
+        return response
+    
+    def test_product_list(self):
+        self.assertWithinBudget(reverse('product_list'), {'category': Product.LAPTOP})
+    
+    def test_product_feed(self):
+        page = self.assertWithinBudget(reverse('product_feed')).json()
+        self.assertWithinBudget(page['next_url'])
+    
+    def test_product_detail(self):
+        self.assertWithinBudget(reverse('product_detail', args=[self.products[0].pk]))
+    
+    def test_product_detail_json(self):
+        self.assertWithinBudget(reverse('product_detail_json', args=[self.products[0].pk]))
+    
+    def test_catalog_feed(self):
+        self.assertWithinBudget(reverse('catalog_feed'))
+    
+    def test_product_search(self):
+        self.assertWithinBudget(reverse('product_search'), {'q': 'budget'})
+
+
+class QueryPlanTests(TestCase):
+    """
+    The catalog views read through indexes, without full scans or temporary sorts.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        categories = [value for value, label in Product.CATEGORY_CHOICES]
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {number:04d}', description='Query plan', price=10 + number % 90,
+                category=categories[number % len(categories)], inventory=number % 7,
+            )
+            for number in range(500)
+        ])
+        cls.product = Product.objects.filter(inventory__gt=0).first()
+        refresh_facets()
+        save_recommendations(build_recommendations())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    
+    def setUp(self):
+        get_catalog_cache().clear()
+        # Load the snapshot now; pages only check for a newer one every few minutes
+        store.checked_at = None
+        get_recommendations()
+        self.client.force_login(User.objects.create_user('shopper'))
+    
+    def assertUsesIndexes(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertLess(response.status_code, 400)
+        problems = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if query['sql'].split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                    problems += [(line, query['sql']) for line in find_problems(explain(cursor, query['sql']))]
+        self.assertEqual(problems, [])
+        return response
+    
+    def test_product_list(self):
+        self.assertUsesIndexes(reverse('product_list'))
+        self.assertUsesIndexes(reverse('product_list'), {'category': Product.LAPTOP, 'in_stock': 'on'})
+        self.assertUsesIndexes(reverse('product_list'), {'min_price': 20, 'max_price': 40, 'sort': 'price'})
+    
+    def test_product_feed_pages(self):
+        for sort in ('', '-price'):
+            page = self.assertUsesIndexes(reverse('product_feed'), {'category': Product.LAPTOP, 'sort': sort}).json()
+            self.assertUsesIndexes(page['next_url'])
+    
+    def test_forged_cursor(self):
+        # Well-formed cursors whose values do not fit the ordering fall back to the first page
+        for name in ('product_list', 'product_feed', 'catalog_feed'):
+            self.assertUsesIndexes(reverse(name), {'after': encode_cursor(['x', 'abc'])})
+    
+    def test_product_detail(self):
+        self.assertUsesIndexes(reverse('product_detail', args=[self.product.pk]))
+
+
+class RenditionTests(TestCase):
+    """
+    Renditions are named after the whole source file and go away with it.
+    """
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+    
+    def upload(self, name, image_format):
+        buffer = BytesIO()
+        Image.new('RGB', (20, 10), (200, 30, 30)).save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue())
+    
+    def renditions(self, image_name):
+        return [
+            default_storage.exists(rendition_name(image_name, size, extension))
+            for size in RENDITION_SIZES for extension in RENDITION_FORMATS
+        ]
+    
+    def save_form(self, image, instance=None):
+        data = {
+            'sku': 'RENDER-1', 'name': 'Lamp', 'description': 'Bright', 'price': '10.00',
+            'category': Product.LAPTOP, 'inventory': 1,
+        }
+        form = ProductForm(data, {'image': image}, instance=instance)
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = form.save()
+        generate_renditions(product.image.name)
+        return product
+    
+    def test_extensions_do_not_collide(self):
+        self.assertNotEqual(
+            rendition_name('products/lamp.png', 'card', 'webp'), rendition_name('products/lamp.jpg', 'card', 'webp'),
+        )
+    
+    def test_replaced_image_drops_its_renditions(self):
+        product = self.save_form(self.upload('lamp.png', 'PNG'))
+        first = product.image.name
+        self.assertTrue(all(self.renditions(first)))
+        product = self.save_form(self.upload('lamp.jpg', 'JPEG'), instance=Product.objects.get(pk=product.pk))
+        self.assertFalse(any(self.renditions(first)))
+        self.assertTrue(all(self.renditions(product.image.name)))
+    
+    def test_shared_image_keeps_its_renditions(self):
+        product = self.save_form(self.upload('lamp.png', 'PNG'))
+        first = product.image.name
+        Product.objects.create(
+            sku='RENDER-2', name='Twin', description='Same picture', price=Decimal('10.00'),
+            category=Product.LAPTOP, image=first,
+        )
+        self.save_form(self.upload('other.png', 'PNG'), instance=Product.objects.get(pk=product.pk))
+        self.assertTrue(all(self.renditions(first)))
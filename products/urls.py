@@ -5,9 +5,15 @@ urlpatterns = [
     # Public views
     path('', views.product_list, name='product_list'),
     path('<int:pk>/', views.product_detail, name='product_detail'),
+    path('<int:pk>/json/', views.product_detail_json, name='product_detail_json'),
+    path('products/feed/', views.product_feed, name='product_feed'),
+    path('products/catalog/', views.catalog_feed, name='catalog_feed'),
+    path('products/events/', views.product_events, name='product_events'),
+    path('search/', views.product_search, name='product_search'),
     
     # Admin views - more accessible paths
     path('products/manage/', views.admin_product_list, name='admin_product_list'),
+    path('products/export/', views.export_products, name='export_products'),
     path('products/add/', views.add_product, name='add_product'),
     path('products/<int:pk>/edit/', views.edit_product, name='edit_product'),
     path('products/<int:pk>/delete/', views.delete_product, name='delete_product'),
@@ -1,35 +1,317 @@
+import asyncio
+import hashlib
+import json
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+from cart.utils import get_cart_summary
+from .cache import get_product, get_product_page, get_products
+from .bulk import delete_products, set_category, update_prices_and_stock
+from .catalog_io import export_rows
+from .events import broker
+from .facets import get_facets
+from .filters import filter_params, filter_products
 from .models import Product
-from .forms import ProductForm, ProductFilterForm
+from .pagination import KeysetPaginator
+from .recommendations import get_recommendations, record_view
+from .search import search_products
+from .forms import ProductBulkActionForm, ProductFilterForm, ProductForm, ProductStockFormSet
 
-def product_list(request):
+# Number of product cards per page and per infinite-scroll batch
+PRODUCTS_PER_PAGE = 24
+
+def _page_url(name, filters, cursor):
     """
-    Display a list of all available products with optional filtering.
+    Return the URL of the page that starts after the given cursor.
+    """
+    params = {'after': cursor, **filter_params(filters)}
+    return f"{reverse(name)}?{urlencode(params)}"
+
+def _get_filters(request, facets=None):
+    """
+    Return the filter form of the request and its valid filters.
+    """
+    form = ProductFilterForm(request.GET, facets=facets)
+    return form, form.get_filters()
+
+def _get_category(request):
+    """
+    Return the validated category filter of the request ('' for all categories).
     """
-    products = Product.objects.all()
-    
-    # Handle category filtering
     form = ProductFilterForm(request.GET)
-    if form.is_valid() and form.cleaned_data['category']:
-        products = products.filter(category=form.cleaned_data['category'])
+    category = form.cleaned_data['category'] if form.is_valid() else ''
+    return form, category
+
+def _page_validators(request, products, *extra):
+    """
+    Return the ETag and Last-Modified timestamp of a page showing products.
+    
+    Besides the products the page shows the header cart badge, so the
+    logged-in user and the last change of their cart, or the contents of
+    an anonymous visitor's cookie cart, are part of the ETag.
+    """
+    parts = [f'{product.pk}:{product.updated_at.timestamp()}' for product in products]
+    parts += [str(part) for part in extra]
+    # Pages link to the content-hashed assets of the current static build
+    parts.append(getattr(staticfiles_storage, 'manifest_hash', ''))
+    last_modified = max((product.updated_at for product in products), default=None)
+    cart = get_cart_summary(request).cart
+    if request.user.is_authenticated:
+        parts.append(f'user:{request.user.pk}:{cart.updated_at.timestamp()}')
+        last_modified = max(last_modified, cart.updated_at) if last_modified else cart.updated_at
+    elif cart.lines:
+        # Cookie carts have no modification time, so only the ETag can validate
+        parts.append(f'cart:{cart.encode()}')
+        last_modified = None
+    etag = '"%s"' % hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+def _conditional_render(request, products, extra, render_page):
+    """
+    Answer a conditional GET with 304 if the page is unchanged, otherwise render it.
+    
+    The validators are computed from data the view has already loaded, so a
+    304 costs no template rendering.
+    """
+    etag, last_modified = _page_validators(request, products, *extra)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render_page()
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Pages hold a CSRF token and the cart badge, so only the browser may
+    # store them, and it has to revalidate on every visit
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def product_list(request):
+    """
+    Display a page of available products with optional filtering, sorting and category facets.
+    """
+    facets = get_facets()
+    form, filters = _get_filters(request, facets)
+    page = get_product_page(filters, request.GET.get('after'), PRODUCTS_PER_PAGE)
     
     context = {
-        'products': products,
+        'products': page,
         'filter_form': form,
+        'facet': form.get_facet(),
+    }
+    if page.has_next():
+        context['next_url'] = _page_url('product_list', filters, page.next_cursor)
+        context['next_feed_url'] = _page_url('product_feed', filters, page.next_cursor)
+    # The sidebar shows the facets, so they are part of the validators
+    facet_parts = [
+        f'{facet.category}:{facet.product_count}:{facet.in_stock_count}:{facet.min_price}:{facet.max_price}'
+        for facet in facets.values()
+    ]
+    return _conditional_render(
+        request, page, [page.next_cursor, *facet_parts],
+        lambda: render(request, 'products/product_list.html', context),
+    )
+
+def _product_data(product):
+    """
+    Return the JSON representation of a product used by the feeds.
+    """
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'category': product.category,
+        'inventory': product.inventory,
+        'available': product.available,
+        'url': product.get_absolute_url(),
+    }
+
+def product_feed(request):
+    """
+    Return the next page of products as JSON for infinite scrolling.
+    """
+    form, filters = _get_filters(request)
+    page = get_product_page(filters, request.GET.get('after'), PRODUCTS_PER_PAGE)
+    html = render_to_string('products/includes/product_cards.html', {'products': page}, request=request)
+    return JsonResponse({
+        'products': [_product_data(product) for product in page],
+        'html': html,
+        'next_cursor': page.next_cursor,
+        'next_url': _page_url('product_feed', filters, page.next_cursor) if page.has_next() else None,
+    })
+
+# Number of results per search page
+SEARCH_RESULTS_PER_PAGE = 24
+
+def product_search(request):
+    """
+    Full-text search over product names and descriptions with category facets.
+    """
+    query = request.GET.get('q', '').strip()
+    form, category = _get_category(request)
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    results = search_products(query, category, page, SEARCH_RESULTS_PER_PAGE)
+    
+    facets = [
+        {
+            'category': value,
+            'count': results.facets.get(value, 0),
+            'url': f"{reverse('product_search')}?{urlencode({'q': query, 'category': value})}",
+        }
+        for value, label in Product.CATEGORY_CHOICES
+        if results.facets.get(value)
+    ]
+    context = {
+        'query': query,
+        'category': category,
+        'results': results,
+        'facets': facets,
+        'all_url': f"{reverse('product_search')}?{urlencode({'q': query})}",
     }
-    return render(request, 'products/product_list.html', context)
+    base_params = {'q': query, 'category': category} if category else {'q': query}
+    if results.has_previous():
+        context['previous_url'] = f"{reverse('product_search')}?{urlencode({**base_params, 'page': page - 1})}"
+    if results.has_next():
+        context['next_url'] = f"{reverse('product_search')}?{urlencode({**base_params, 'page': page + 1})}"
+    return render(request, 'products/search_results.html', context)
+
+# Product cards shown per recommendation row on the detail page
+RECOMMENDATIONS_SHOWN = 3
 
 def product_detail(request, pk):
     """
-    Display detailed information for a single product.
+    Display detailed information for a single product with recommendations.
+    
+    The recommendations come from the in-memory snapshot and the recently
+    viewed list from the cache; all their products are read with one cache
+    lookup, so a warm page makes no extra queries.
     """
-    product = get_object_or_404(Product, pk=pk)
+    product = get_product(pk)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    recommendations = get_recommendations()
+    also_bought = recommendations.get('also_bought', product.pk)
+    related = [other for other in recommendations.get('related', product.pk) if other not in also_bought]
+    recent = [other for other in record_view(request, product.pk) if other != product.pk]
+    products = {other.pk: other for other in get_products(also_bought + related + recent)}
+    
+    def available(ids):
+        return [products[other] for other in ids if other in products and products[other].is_available()]
+    
     context = {
         'product': product,
+        'also_bought': available(also_bought)[:RECOMMENDATIONS_SHOWN],
+        'related': available(related)[:RECOMMENDATIONS_SHOWN],
+        'recently_viewed': [products[other] for other in recent if other in products][:RECOMMENDATIONS_SHOWN],
     }
-    return render(request, 'products/product_detail.html', context)
+    sections = [
+        f"{name}:{','.join(str(other.pk) for other in context[name])}"
+        for name in ('also_bought', 'related', 'recently_viewed')
+    ]
+    shown = [product, *context['also_bought'], *context['related'], *context['recently_viewed']]
+    return _conditional_render(
+        request, shown, sections,
+        lambda: render(request, 'products/product_detail.html', context),
+    )
+
+async def product_detail_json(request, pk):
+    """
+    Return a single product as JSON.
+    """
+    product = await sync_to_async(get_product)(pk)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    data = _product_data(product)
+    data['description'] = product.description
+    data['image'] = product.image.url if product.image else None
+    return JsonResponse(data)
+
+# Largest page the catalog feed will return
+CATALOG_FEED_MAX_PER_PAGE = 100
+
+async def catalog_feed(request):
+    """
+    Return a page of the catalog as plain JSON for API clients.
+    
+    Unlike product_feed it renders no HTML, so it runs entirely on the async
+    ORM and a page is streamed from the database with aiterator().
+    """
+    form, filters = _get_filters(request)
+    try:
+        per_page = min(max(int(request.GET.get('per_page', PRODUCTS_PER_PAGE)), 1), CATALOG_FEED_MAX_PER_PAGE)
+    except ValueError:
+        per_page = PRODUCTS_PER_PAGE
+    products, ordering = filter_products(
+        Product.objects.only('id', 'name', 'price', 'category', 'inventory', 'reserved'), filters,
+    )
+    page = await KeysetPaginator(products, ordering=ordering, per_page=per_page).aget_page(request.GET.get('after'))
+    next_url = None
+    if page.has_next():
+        next_url = _page_url('catalog_feed', filters, page.next_cursor)
+        if per_page != PRODUCTS_PER_PAGE:
+            next_url += f"&per_page={per_page}"
+    return JsonResponse({
+        'products': [_product_data(product) for product in page],
+        'next_cursor': page.next_cursor,
+        'next_url': next_url,
+    })
+
+# Products one event stream can follow
+EVENT_STREAM_MAX_PRODUCTS = 200
+# Seconds between keep-alive comments on an idle event stream
+EVENT_STREAM_HEARTBEAT = 15
+# Seconds before a stream is closed; the browser reconnects on its own,
+# so abandoned streams do not linger
+EVENT_STREAM_MAX_AGE = 300
+# Milliseconds the browser waits before reconnecting
+EVENT_STREAM_RETRY = 3000
+
+async def product_events(request):
+    """
+    Stream price and stock changes of products as Server-Sent Events.
+    
+    ?ids=1,2,3 limits the stream to the products shown on the page. Each
+    "product" event carries a JSON list of {id, price, available}. The
+    stream needs the ASGI server: under WSGI it would tie up a worker, so
+    the endpoint answers 204, which tells EventSource not to reconnect.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    ids = [value for value in request.GET.get('ids', '').split(',') if value.isdigit()]
+    product_ids = {int(value) for value in ids[:EVENT_STREAM_MAX_PRODUCTS]} or None
+    
+    async def stream():
+        subscription = broker.subscribe(product_ids)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + EVENT_STREAM_MAX_AGE
+        try:
+            yield f"retry: {EVENT_STREAM_RETRY}\n\n"
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    events = await asyncio.wait_for(subscription.queue.get(), min(EVENT_STREAM_HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: product\ndata: {json.dumps(events, cls=DjangoJSONEncoder)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Admin functions
 def is_admin(user):
@@ -38,18 +320,108 @@ def is_admin(user):
     """
     return user.is_staff
 
+@login_required
+@user_passes_test(is_admin)
+def export_products(request):
+    """
+    Stream the whole catalog as a CSV or JSONL file (?format=jsonl) that import_products can load.
+    """
+    file_format = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    content_type = 'application/x-ndjson' if file_format == 'jsonl' else 'text/csv; charset=utf-8'
+    response = StreamingHttpResponse(export_rows(file_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+    return response
+
+# Rows per page of the staff product list
+ADMIN_PRODUCTS_PER_PAGE = 50
+# Columns the staff product list shows; the descriptions stay in the database
+ADMIN_LIST_FIELDS = ('id', 'sku', 'name', 'category', 'price', 'inventory', 'reserved', 'image', 'has_renditions')
+
 @login_required
 @user_passes_test(is_admin)
 def admin_product_list(request):
     """
-    Display a list of all products for admin management.
+    Display a page of products for admin management.
+    
+    Prices and stock of the whole page are edited inline and saved with one
+    bulk_update; the selected products can be deleted or moved to another
+    category in bulk.
     """
-    products = Product.objects.all()
+    category = request.GET.get('category', '')
+    if category not in dict(Product.CATEGORY_CHOICES):
+        category = ''
+    products = Product.objects.only(*ADMIN_LIST_FIELDS)
+    if category:
+        products = products.filter(category=category)
+    page = KeysetPaginator(products, per_page=ADMIN_PRODUCTS_PER_PAGE).get_page(request.GET.get('after'))
+    
+    action_form = ProductBulkActionForm()
+    formset = None
+    if request.method == 'POST' and '_apply' in request.POST:
+        action_form = ProductBulkActionForm(request.POST)
+        if action_form.is_valid():
+            return _apply_bulk_action(request, action_form)
+        messages.error(request, 'Select some products and an action, and a category to move them to.')
+    elif request.method == 'POST':
+        formset = ProductStockFormSet(request.POST)
+        if formset.is_valid():
+            updated, conflicts = update_prices_and_stock([form.cleaned_data for form in formset])
+            if updated:
+                messages.success(request, f'Updated {len(updated)} product(s).')
+            if conflicts:
+                names = ', '.join(product.name for product in conflicts)
+                messages.warning(request, f'Not updated because they changed in the meantime: {names}.')
+            return redirect(request.get_full_path())
+    
+    if formset is None:
+        formset = ProductStockFormSet(initial=[
+            {
+                'id': product.pk,
+                'price': product.price,
+                'inventory': product.inventory,
+                'original_price': product.price,
+                'original_inventory': product.inventory,
+            }
+            for product in page
+        ])
+        rows = list(zip(page, formset))
+    else:
+        # Show the invalid rows as they were posted
+        by_id = {product.pk: product for product in page}
+        rows = [(by_id[form.cleaned_data['id']], form) for form in formset if form.cleaned_data.get('id') in by_id]
+    
     context = {
-        'products': products,
+        'rows': rows,
+        'formset': formset,
+        'action_form': action_form,
+        'category': category,
+        'category_choices': Product.CATEGORY_CHOICES,
     }
+    if page.has_next():
+        params = {'after': page.next_cursor, 'category': category} if category else {'after': page.next_cursor}
+        context['next_url'] = f"{reverse('admin_product_list')}?{urlencode(params)}"
     return render(request, 'products/admin_product_list.html', context)
 
+def _apply_bulk_action(request, form):
+    """
+    Delete the selected products (after a confirmation page) or move them to another category.
+    """
+    selected = form.cleaned_data['selected']
+    if form.cleaned_data['action'] == ProductBulkActionForm.SET_CATEGORY:
+        category = form.cleaned_data['category']
+        count = set_category(selected, category)
+        messages.success(request, f'Moved {count} product(s) to {category}.')
+    elif 'confirm' not in request.POST:
+        context = {
+            'products': selected.only('id', 'name', 'category', 'price', 'inventory').order_by('name', 'id'),
+            'next': request.get_full_path(),
+        }
+        return render(request, 'products/product_bulk_delete.html', context)
+    else:
+        count = delete_products(selected)
+        messages.success(request, f'Deleted {count} product(s).')
+    return redirect(request.get_full_path())
+
 @login_required
 @user_passes_test(is_admin)
 def add_product(request):
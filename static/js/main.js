@@ -33,6 +33,18 @@ document.addEventListener('DOMContentLoaded', function() {
     // Handle Add to Cart buttons with AJAX
     const addToCartButtons = document.querySelectorAll('.add-to-cart-btn');
     
+    // Products already in the cart, so cards loaded later can be marked too
+    const cartProductIds = new Set();
+    
+    function markAddedButtons(root) {
+        root.querySelectorAll('.add-to-cart-btn').forEach(button => {
+            if (cartProductIds.has(parseInt(button.getAttribute('data-product-id')))) {
+                button.textContent = 'Added to Cart';
+                button.classList.add('added');
+            }
+        });
+    }
+    
     // Check if products are in cart on page load
     function checkCartStatus() {
         fetch('/cart/check-status/', {
@@ -45,13 +57,8 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
             if (data.cart_items) {
                 // Update buttons for products that are in the cart
-                data.cart_items.forEach(item => {
-                    const button = document.querySelector(`.add-to-cart-btn[data-product-id="${item.product_id}"]`);
-                    if (button) {
-                        button.textContent = 'Added to Cart';
-                        button.classList.add('added');
-                    }
-                });
+                data.cart_items.forEach(item => cartProductIds.add(item.product_id));
+                markAddedButtons(document);
             }
         })
         .catch(error => console.error('Error checking cart status:', error));
@@ -60,7 +67,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Call on page load
     checkCartStatus();
     
-    addToCartButtons.forEach(button => {
+    function bindAddToCartButton(button) {
         button.addEventListener('click', function(e) {
             e.preventDefault();
             
@@ -126,7 +133,104 @@ document.addEventListener('DOMContentLoaded', function() {
                 showMessage('error', 'Error adding item to cart.');
             });
         });
-    });
+    }
+    
+    addToCartButtons.forEach(bindAddToCartButton);
+
+    // Live price and stock updates for the products on the page, pushed by
+    // the server as Server-Sent Events instead of being polled
+    let productEvents = null;
+    
+    function updateProduct(product) {
+        document.querySelectorAll(`[data-stock-for="${product.id}"]`).forEach(stock => {
+            const inStock = product.available > 0;
+            stock.textContent = inStock
+                ? stock.getAttribute('data-stock-label').replace('{n}', product.available)
+                : 'Out of Stock';
+            stock.classList.toggle('in-stock', inStock);
+            stock.classList.toggle('out-of-stock', !inStock);
+        });
+        if (product.price !== null) {
+            document.querySelectorAll(`[data-price-for="${product.id}"]`).forEach(price => {
+                price.textContent = `$${product.price}`;
+            });
+        }
+        document.querySelectorAll(`[data-max-for="${product.id}"]`).forEach(input => {
+            input.max = product.available;
+        });
+        document.querySelectorAll(`.add-to-cart-btn[data-product-id="${product.id}"]`).forEach(button => {
+            button.classList.toggle('disabled', product.available === 0);
+            button.setAttribute('aria-disabled', product.available === 0);
+        });
+    }
+    
+    function subscribeToProductEvents() {
+        if (!('EventSource' in window)) {
+            return;
+        }
+        const ids = new Set();
+        document.querySelectorAll('[data-stock-for]').forEach(stock => ids.add(stock.getAttribute('data-stock-for')));
+        if (productEvents) {
+            productEvents.close();
+            productEvents = null;
+        }
+        if (ids.size === 0) {
+            return;
+        }
+        productEvents = new EventSource(`/products/events/?ids=${Array.from(ids).join(',')}`);
+        productEvents.addEventListener('product', event => {
+            JSON.parse(event.data).forEach(updateProduct);
+        });
+    }
+    
+    subscribeToProductEvents();
+
+    // Infinite scroll: load the next page of products when the "Load More"
+    // block comes into view, falling back to the plain link without JS support
+    const loadMore = document.querySelector('.load-more');
+    const productGrid = document.querySelector('.product-grid');
+    if (loadMore && productGrid && 'IntersectionObserver' in window) {
+        let loading = false;
+        const observer = new IntersectionObserver(entries => {
+            if (!entries[0].isIntersecting || loading) {
+                return;
+            }
+            const feedUrl = loadMore.getAttribute('data-feed-url');
+            if (!feedUrl) {
+                return;
+            }
+            loading = true;
+            fetch(feedUrl, {
+                method: 'GET',
+                headers: {
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                const batch = document.createElement('div');
+                batch.innerHTML = data.html;
+                markAddedButtons(batch);
+                batch.querySelectorAll('.add-to-cart-btn').forEach(bindAddToCartButton);
+                while (batch.firstElementChild) {
+                    productGrid.appendChild(batch.firstElementChild);
+                }
+                subscribeToProductEvents();
+                if (data.next_url) {
+                    loadMore.setAttribute('data-feed-url', data.next_url);
+                } else {
+                    observer.disconnect();
+                    loadMore.remove();
+                }
+                loading = false;
+            })
+            .catch(error => {
+                console.error('Error loading products:', error);
+                loading = false;
+            });
+        }, { rootMargin: '400px' });
+        observer.observe(loadMore);
+    }
 
     // Product card quantity controls
     const productQuantityControls = document.querySelectorAll('.product-quantity-controls');
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Task
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the Task model.
+    """
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key',)
+    readonly_fields = ('created_at', 'finished_at', 'locked_at', 'last_error')
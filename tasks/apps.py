@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class TasksConfig(AppConfig):
+    name = 'tasks'
+
+    def ready(self):
+        # Register the task functions defined in the tasks.py of every app
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
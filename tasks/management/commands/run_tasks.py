@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from tasks.worker import Worker, purge_finished
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks on a pool of threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Tasks run at the same time.")
+        parser.add_argument('--batch-size', type=int, help="Tasks claimed at a time (default: 4 per thread).")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait when no task is due.")
+        parser.add_argument('--once', action='store_true', help="Run the tasks due now and exit.")
+        parser.add_argument('--purge-days', type=int,
+                            help="Delete tasks that finished more than this many days ago, then exit.")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            count = purge_finished(options['purge_days'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} finished task(s)."))
+            return
+        worker = Worker(options['threads'], options['batch_size'], options['poll_interval'])
+        if options['once']:
+            count = 0
+            while ran := worker.run_once():
+                count += ran
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} task(s)."))
+            return
+        self.stdout.write(f"Running tasks on {options['threads']} thread(s); press Ctrl+C to stop.")
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,53 @@
+from django.db import models
+from django.utils import timezone
+
+class Task(models.Model):
+    """
+    A queued call of a registered task function, run by the run_tasks worker.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    # Registered name of the task function, see tasks.queue.task
+    name = models.CharField(max_length=200)
+    # Keyword arguments of the call
+    payload = models.JSONField(default=dict, blank=True)
+    # A task is queued at most once per key, however often it is enqueued
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    # When a worker claimed the task; stale claims of crashed workers are retried
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Due tasks, oldest first, as claimed by the workers
+            models.Index(
+                fields=['run_after', 'id'],
+                condition=models.Q(status='pending'),
+                name='task_pending_idx',
+            ),
+            # Claims of workers that may have crashed
+            models.Index(
+                fields=['locked_at'],
+                condition=models.Q(status='running'),
+                name='task_running_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
@@ -0,0 +1,106 @@
+"""
+A small task queue backed by the Task table.
+
+Functions are registered with @task and queued with enqueue(). Queuing
+inserts a row in the caller's transaction, so a task is queued exactly
+when the work that asked for it commits, and the run_tasks worker picks
+it up from there. With TASKS_EAGER the tasks instead run in the calling
+process right after the commit, which is handy without a worker; calls
+with an idempotency key are still recorded, so a key runs only once,
+but delays are not honored.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Task
+
+_registry = {}
+
+class UnknownTask(LookupError):
+    """
+    Raised for a task name that no @task function is registered under.
+    """
+
+def task(func=None, *, name=None):
+    """
+    Register a function as a task, under its dotted path unless a name is given.
+    
+    Task functions take JSON-serializable keyword arguments. They may be
+    run more than once (after a worker crash or a retried failure), so
+    they should be safe to repeat.
+    """
+    def register(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[func.task_name] = func
+        return func
+    return register(func) if func is not None else register
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise UnknownTask(f"No task is registered as {name!r}.")
+
+def enqueue(name, payload=None, key=None, delay=0):
+    """
+    Queue one call of a task; see enqueue_many.
+    """
+    enqueue_many([(name, payload, key)], delay)
+
+def enqueue_many(calls, delay=0):
+    """
+    Queue (name, payload, idempotency_key) calls with a single INSERT.
+    
+    Calls whose key was queued before are skipped. Tasks become due after
+    delay seconds.
+    """
+    for name, payload, key in calls:
+        get_task(name)
+    if settings.TASKS_EAGER:
+        _enqueue_eager(calls)
+        return
+    run_after = timezone.now() + timedelta(seconds=delay)
+    Task.objects.bulk_create(
+        [
+            Task(name=name, payload=payload or {}, idempotency_key=key, run_after=run_after)
+            for name, payload, key in calls
+        ],
+        ignore_conflicts=True,
+    )
+
+def _enqueue_eager(calls):
+    """
+    Run the calls after the commit, skipping keys that were queued before.
+    
+    Keyed calls are recorded as done tasks, so their keys are remembered as
+    they would be in the queue.
+    """
+    keys = [key for name, payload, key in calls if key is not None]
+    seen = set(Task.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True)) if keys else set()
+    recorded = []
+    for name, payload, key in calls:
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+            recorded.append(Task(
+                name=name, payload=payload or {}, idempotency_key=key,
+                status=Task.DONE, attempts=1, finished_at=timezone.now(),
+            ))
+        # A failing task is logged instead of failing the request that queued it
+        transaction.on_commit(_eager_call(get_task(name), payload or {}, key), robust=True)
+    if recorded:
+        Task.objects.bulk_create(recorded, ignore_conflicts=True)
+
+def _eager_call(func, payload, key=None):
+    def run_task():
+        try:
+            func(**payload)
+        except Exception:
+            if key is not None:
+                Task.objects.filter(idempotency_key=key).update(status=Task.FAILED, last_error=traceback.format_exc())
+            raise
+    return run_task
@@ -0,0 +1,56 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .models import Task
+from .queue import enqueue, task
+from .worker import claim_tasks
+
+calls = []
+
+@task(name='tasks.tests.record')
+def record(value):
+    calls.append(value)
+
+
+class StaleClaimTests(TestCase):
+    """
+    Tasks whose worker died are retried until their attempts are used up.
+    """
+    def create_stale(self, attempts):
+        return Task.objects.create(
+            name='tasks.tests.record', payload={'value': 1}, status=Task.RUNNING, attempts=attempts,
+            max_attempts=3, locked_at=timezone.now() - timedelta(days=1),
+        )
+    
+    def test_stale_task_is_claimed_again(self):
+        stale = self.create_stale(attempts=1)
+        self.assertEqual([claimed.pk for claimed in claim_tasks(10)], [stale.pk])
+    
+    def test_stale_task_without_attempts_left_fails(self):
+        stale = self.create_stale(attempts=3)
+        self.assertEqual(claim_tasks(10), [])
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Task.FAILED)
+        self.assertIsNotNone(stale.finished_at)
+
+
+@override_settings(TASKS_EAGER=True)
+class EagerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+    
+    def test_key_runs_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tasks.tests.record', {'value': 1}, key='once')
+            enqueue('tasks.tests.record', {'value': 2}, key='once')
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tasks.tests.record', {'value': 3}, key='once')
+        self.assertEqual(calls, [1])
+        self.assertEqual(Task.objects.get(idempotency_key='once').status, Task.DONE)
+    
+    def test_calls_without_key_always_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tasks.tests.record', {'value': 1})
+            enqueue('tasks.tests.record', {'value': 1})
+        self.assertEqual(calls, [1, 1])
+        self.assertFalse(Task.objects.exists())
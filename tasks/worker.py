@@ -0,0 +1,116 @@
+"""
+Worker that runs queued tasks on a pool of threads.
+
+Due tasks are claimed with a conditional UPDATE per task, so any number
+of workers can share the queue without running a task twice at once.
+Failed tasks are retried with exponential backoff until max_attempts is
+reached; tasks claimed by a worker that died are claimed again once
+TASKS_LOCK_TIMEOUT has passed, unless that claim was their last attempt.
+"""
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+from .models import Task
+from .queue import get_task
+
+logger = logging.getLogger(__name__)
+
+def retry_delay(attempts):
+    """
+    Return the seconds to wait before the next attempt of a task that failed attempts times.
+    """
+    return min(settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1), settings.TASKS_MAX_RETRY_DELAY)
+
+def claim_tasks(limit):
+    """
+    Claim up to limit due tasks for this worker and return them.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT))
+    # A task that keeps taking its worker down fails like any other once its attempts are used up
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, locked_at=None, finished_at=now,
+        last_error="The worker running the task stopped before it finished.",
+    )
+    stale.update(status=Task.PENDING, locked_at=None)
+    candidates = Task.objects.filter(status=Task.PENDING, run_after__lte=now).order_by('run_after', 'id')
+    claimed = [
+        pk for pk in candidates.values_list('pk', flat=True)[:limit]
+        # Another worker may have claimed the task since it was listed
+        if Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+    ]
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_after', 'id')) if claimed else []
+
+def run_task(task):
+    """
+    Run a claimed task and record whether it succeeded, will be retried or failed.
+    """
+    try:
+        get_task(task.name)(**task.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts < task.max_attempts:
+            logger.warning("Task %s failed (attempt %d of %d); retrying.", task, task.attempts, task.max_attempts)
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.PENDING, locked_at=None, last_error=error,
+                run_after=timezone.now() + timedelta(seconds=retry_delay(task.attempts)),
+            )
+        else:
+            logger.error("Task %s failed for good after %d attempts.", task, task.attempts)
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.FAILED, locked_at=None, last_error=error, finished_at=timezone.now(),
+            )
+        return False
+    Task.objects.filter(pk=task.pk).update(status=Task.DONE, locked_at=None, finished_at=timezone.now())
+    return True
+
+class Worker:
+    """
+    Claim due tasks in batches and run each batch on a pool of threads.
+    """
+    def __init__(self, threads=4, batch_size=None, poll_interval=1.0):
+        self.threads = threads
+        self.batch_size = batch_size or threads * 4
+        self.poll_interval = poll_interval
+    
+    def run_once(self):
+        """
+        Run one batch of due tasks; returns the number of tasks run.
+        """
+        close_old_connections()
+        tasks = claim_tasks(self.batch_size)
+        if tasks:
+            with ThreadPoolExecutor(self.threads) as executor:
+                list(executor.map(self._run_in_thread, tasks))
+        return len(tasks)
+    
+    def run_forever(self):
+        while True:
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+    
+    def _run_in_thread(self, task):
+        try:
+            return run_task(task)
+        finally:
+            # Every pool thread has its own connection
+            connection.close()
+
+def purge_finished(days):
+    """
+    Delete tasks that finished more than days ago; returns the number deleted.
+    
+    Their idempotency keys are forgotten with them.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, by_model = Task.objects.filter(status__in=[Task.DONE, Task.FAILED], finished_at__lt=cutoff).delete()
+    return deleted
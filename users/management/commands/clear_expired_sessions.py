@@ -0,0 +1,42 @@
+import time
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+def delete_expired_sessions(model, batch_size):
+    """
+    Delete the expired rows of a session model, batch_size rows per query; returns the number deleted.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(model.objects.filter(expire_date__lt=now).values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        count, by_model = model.objects.filter(pk__in=keys, expire_date__lt=now).delete()
+        deleted += count
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions from the session table in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Sessions deleted per query.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and sweep every INTERVAL seconds instead of once.")
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            # Signed-cookie and cache sessions expire on their own
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session table; nothing to sweep.")
+            return
+        model = store.get_model_class()
+        while True:
+            count = delete_expired_sessions(model, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired session(s)."))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
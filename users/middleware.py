@@ -0,0 +1,73 @@
+"""
+Authentication backed by a cache of the users of active sessions.
+
+CachedAuthenticationMiddleware replaces Django's AuthenticationMiddleware.
+With AUTH_USER_CACHE enabled (see SESSION_PROFILE in the settings) the
+logged-in user is read from the cache together with the id of their
+cart, so an authenticated page view no longer queries the user table.
+The cache is only trusted when the session's auth hash matches the
+cached user exactly; anything else (a changed password, rotated secret
+keys, a missing entry) goes through django.contrib.auth.get_user.
+Cached users are dropped whenever they are saved or deleted.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from cart.models import Cart
+
+def get_user_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+def forget_user(user_id):
+    """
+    Drop the cached entry of a user so the next request reloads it.
+    """
+    get_user_cache().delete(user_cache_key(user_id))
+
+def get_user(request):
+    """
+    Return the user of the request's session, from the cache when possible.
+    
+    Also sets request.cart_id to the id of the user's cart when it is
+    known, which cart.utils.get_cart_summary uses to load the cart.
+    """
+    if not hasattr(request, '_cached_user'):
+        request.cart_id = None
+        request._cached_user = _load_user(request)
+    return request._cached_user
+
+def _load_user(request):
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    if user_id is None or session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+    key = user_cache_key(user_id)
+    cached = get_user_cache().get(key)
+    if cached is not None:
+        user, cart_id = cached
+        session_hash = session.get(HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            request.cart_id = cart_id
+            return user
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cart_id = Cart.objects.filter(user=user).values_list('pk', flat=True).first()
+        get_user_cache().set(key, (user, cart_id), settings.AUTH_USER_CACHE_TIMEOUT)
+        request.cart_id = cart_id
+    return user
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that loads the user through the user cache when it is enabled.
+    """
+    def process_request(self, request):
+        super().process_request(request)
+        if settings.AUTH_USER_CACHE:
+            request.user = SimpleLazyObject(lambda: get_user(request))
@@ -0,0 +1,14 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .middleware import forget_user
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    Drop the cached copy of a user whose password, permissions or status may have changed.
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda: forget_user(pk))